@@ -2,7 +2,7 @@ from typing import Any, Annotated, List
 from datetime import datetime
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Query
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import select
@@ -11,12 +11,14 @@ from app.api.deps import get_db, get_current_user
 from app.crud.crud_comment import comment
 from app.schemas import image
 from app.schemas.comment import CommentDBOut, CommentCreate, CommentDBCreate, CommentUpdate, CommentDBUpdate, \
-	CommentsDBOut, CommentDBOutWithComments
+	CommentDBOutWithReplies, CommentDBOutWithComments, CommentsNormalizedOut
+from app.schemas.page import Page
 from app.schemas.exceptions import ErrorResponse
 from app.schemas.responses import SuccessResponse
 from app.models.users import Users
 from app.models.image import Image
 from app.utils.image_processing import image_processing, image_delete, image_exist_check
+from app.utils.page import lookahead_page_dict, decode_cursor
 from app.core.config import settings
 
 
@@ -138,28 +140,53 @@ def delete_comment(
 	return {"success": "Comment has been deleted."}
 
 
-@router.get("/{image_id}/comments", response_model=CommentsDBOut, status_code=status.HTTP_200_OK)
+@router.get("/{image_id}/comments", response_model=Page[CommentDBOutWithReplies], status_code=status.HTTP_200_OK)
 def get_comments(
 		*,
 		db: Annotated[Session, Depends(get_db)],
 		current_user: Annotated[Users, Depends(get_current_user)],
-		image_id: int
+		image_id: int,
+		size: int = Query(20, ge=1, le=100, description="Page size"),
+		cursor: str | None = Query(None, description="next_cursor from previous page, empty value for the first page")
 ) -> Any:
+	"""Возвращает комментарии верхнего уровня к картинке, от старых к новым, с keyset пагинацией."""
 	db_image = db.execute(select(Image).filter_by(id=image_id)).scalar_one_or_none()
-	db_comments = comment.get_object_comments(db, obj_to_comment=db_image)
-	return {"comments": db_comments}
+	if not db_image:
+		error_response = ErrorResponse(
+			loc="image_id",
+			msg="The image with this id does not exists",
+			type="value_error"
+		)
+		raise HTTPException(
+			status_code=status.HTTP_404_NOT_FOUND,
+			detail=[error_response.model_dump()]
+		)
+	db_comments = comment.get_object_comments_by_cursor(
+		db, obj_to_comment=db_image, cursor=decode_cursor(cursor) if cursor else None, limit=size
+	)
+	return Page(**lookahead_page_dict(items=db_comments, size=size))
 
 
-@router.get("/comment/{comment_id}", response_model=CommentDBOutWithComments, status_code=status.HTTP_200_OK)
+@router.get(
+	"/comment/{comment_id}",
+	response_model=CommentDBOutWithComments | CommentsNormalizedOut,
+	status_code=status.HTTP_200_OK
+)
 def get_comment(
 		*,
 		db: Annotated[Session, Depends(get_db)],
 		current_user: Annotated[Users, Depends(get_current_user)],
-		comment_id: int
+		comment_id: int,
+		depth: int | None = Query(None, ge=0, description="How many levels of replies to return, all by default"),
+		normalized: bool = Query(False, description="Flat list of comments and authors in a separate users map")
 ) -> Any:
-	"""Возвращает комментарий по id"""
-	db_comment = comment.get(db, id_=comment_id)
-	return db_comment
+	"""Возвращает комментарий по id вместе с ответами. Ветка читается одним запросом (см. CRUDComment.get_thread).
+	normalized=True - ветка плоским списком, а каждый автор один раз в users, для длинных веток"""
+	if normalized:
+		db_comments, authors = comment.get_thread_flat(db, id_=comment_id, depth=depth)
+		return CommentsNormalizedOut(comments=db_comments, users={a.id: a for a in authors})
+	db_comment = comment.get_thread(db, id_=comment_id, depth=depth)
+	return CommentDBOutWithComments.model_validate(db_comment)
 
 
 @router.get("/{image_id}", response_model=image.ImageOut, status_code=status.HTTP_200_OK)
@@ -8,9 +8,11 @@ from app.api.deps import get_db
 from app.schemas.message import Message
 from app.schemas.token import Token
 from app.crud.crud_user import user
+from app.models.users import Users
+from app.crud.crud_revoked_token import revoked_token
 from app.core.security import (
 	create_access_token, create_password_reset_token,
-	verify_password_reset_token, create_refresh_token, verify_token
+	verify_password_reset_token, create_refresh_token, decode_token, oauth2_scheme
 )
 from app.utils.sendmail import send_reset_password
 
@@ -86,16 +88,41 @@ def refresh_access_token(
 		response: Response,
 		refresh_token: Annotated[str, Cookie(alias="refresh_token", include_in_schema=False)] = None
 ) -> dict:
-	user_id = verify_token(refresh_token)
-	user_db = user.get(db, id_=user_id)
-	if not user_db:
+	"""Новый токен доступа по refresh token из cookie. Refresh token одноразовый: старый отзывается,
+	в cookie кладется новый. Повторное предъявление уже использованного токена получает 401"""
+	token_data = decode_token(refresh_token, token_type="refresh_token")
+	user_db = user.get(db, id_=token_data.id)
+	if not revoked_token.revoke(db, token_data=token_data):
 		raise HTTPException(
 			status_code=status.HTTP_401_UNAUTHORIZED,
 			detail="Could not validate credentials",
 			headers={"WWW-Authenticate": "Bearer"}
 		)
 	access_token = create_access_token(user_db.id)
+	response.set_cookie(key="refresh_token", value=create_refresh_token(user_db.id), httponly=True)
 	return {
 		'access_token': access_token,
 		'token_type': 'bearer'
 	}
+
+
+@router.post("/logout", response_model=Message, status_code=status.HTTP_200_OK)
+def logout(
+		db: Annotated[Session, Depends(get_db)],
+		token: Annotated[str, Depends(oauth2_scheme)],
+		response: Response,
+		refresh_token: Annotated[str, Cookie(alias="refresh_token", include_in_schema=False)] = None
+) -> Any:
+	"""Отзываем текущий токен доступа и refresh token из cookie, если он есть и еще действителен.
+	Токены удаленного пользователя не отзываются: их и так не примут, а строки отзыва ссылаются на users"""
+	tokens = [decode_token(token)]
+	if refresh_token:
+		try:
+			tokens.append(decode_token(refresh_token, token_type="refresh_token"))
+		except HTTPException:
+			pass
+	for token_data in tokens:
+		if db.get(Users, token_data.id) is not None:
+			revoked_token.revoke(db, token_data=token_data)
+	response.delete_cookie(key="refresh_token", httponly=True)
+	return {"msg": "Logged out"}
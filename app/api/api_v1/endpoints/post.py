@@ -1,7 +1,8 @@
 from datetime import datetime
-from typing import Annotated, Any, List
+from typing import Annotated, Any, List, Iterator
 
-from fastapi import APIRouter, Depends, status, UploadFile, File, Path, Query
+from fastapi import APIRouter, Depends, status, UploadFile, File, Path, Query, BackgroundTasks
+from fastapi.responses import StreamingResponse
 
 from sqlalchemy.orm import Session
 from sqlalchemy import select
@@ -11,20 +12,27 @@ from fastapi_pagination import Page
 from app.schemas.post import PostCreate, PostUpdate, PostDBOut, PostDBCreate, PostDBUpdate, PostsDBOut
 from app.schemas.image import ImageDB
 from app.schemas.responses import SuccessResponse
-from app.schemas.page import Page
+from app.schemas.page import Page, TotalMode
 from app.schemas.comment import CommentDBOut, CommentCreate, CommentDBCreate, CommentUpdate, CommentDBUpdate
-from app.schemas.comment import CommentDBOutWithComments, CommentsDBOut
-from app.schemas.like import LikeCreate, LikeDBOut, LikesCount
-from app.api.deps import get_db, get_current_user
+from app.schemas.comment import CommentDBOutWithComments, CommentDBOutWithReplies, CommentsNormalizedOut
+from app.schemas.like import LikeCreate, LikeDBOut, LikesCount, LikesEngagement
+from app.schemas.leaderboard import LeaderboardPeriod, TopPost
+from app.schemas.token import TokenData
+from app.api.deps import get_db, get_current_user, get_current_principal
 from app.models.users import Users
 from app.models.image import Image
 from app.models.post import Post
 from app.utils.image_processing import image_processing, image_delete
-from app.utils.page import page_dict
+from app.utils.page import page_dict, lookahead_page_dict, decode_cursor, page_totals
 from app.crud.crud_post import post
 from app.crud.crud_user import user
 from app.crud.crud_comment import comment
 from app.crud.crud_like import likes
+from app.crud.crud_feed import feed
+from app.crud.crud_leaderboard import leaderboard
+from app.utils.timeline import fan_out_post
+from app.utils.likes_buffer import likes_buffer
+from app.core.config import settings
 
 router = APIRouter()
 
@@ -48,8 +56,10 @@ def create(
 			db_image = Image(**image_obj.model_dump())
 			db.add(db_image)
 			db_post.images.append(db_image)
+	user.change_counters(db, user_id=current_user.id, posts_count=1)
 	db.commit()
-	return db_post
+	fan_out_post.delay(db_post.id)
+	return post.hydrate(db, [db_post])[0]
 
 
 @router.put("/update/{post_id}", response_model=PostDBOut, status_code=status.HTTP_200_OK)
@@ -73,7 +83,7 @@ def update(
 			db_post.images.append(db_image)
 	db_post = post.update(db, db_obj=db_post, obj_in=post_obj)
 	db.commit()
-	return db_post
+	return post.hydrate(db, [db_post])[0]
 
 
 @router.delete("/{post_id}", response_model=SuccessResponse, status_code=status.HTTP_200_OK)
@@ -85,7 +95,7 @@ def delete_post(
 ) -> Any:
 	"""Удаляет пост. Также удялятся все файлы связанные с постом."""
 	db_post = post.get(db, id_=post_id)
-	for image in db_post.images.all():
+	for image in db_post.images:
 		image_delete(image.name)
 	post.remove(db, id_=post_id)
 	return {"success": "Post has been deleted."}
@@ -113,10 +123,30 @@ def delete_image_from_post(
 def get_posts(
 		*,
 		db: Annotated[Session, Depends(get_db)],
-		current_user: Annotated[Users, Depends(get_current_user)]
+		current_user: Annotated[Users, Depends(get_current_user)],
+		root_original: bool = Query(False, description="Return the root of a repost chain as original_post")
 ) -> Any:
 	"""Возвращает все посты текущего пользователя"""
-	return {"posts": [p for p in current_user.posts.all()]}
+	return {"posts": post.hydrate(db, current_user.posts.all(), root_original=root_original)}
+
+
+@router.get("/get-all/stream", response_class=StreamingResponse, status_code=status.HTTP_200_OK)
+def stream_posts(
+		*,
+		db: Annotated[Session, Depends(get_db)],
+		current_user: Annotated[Users, Depends(get_current_user)],
+		root_original: bool = Query(False, description="Return the root of a repost chain as original_post")
+) -> Any:
+	"""Возвращает все посты текущего пользователя потоком в формате NDJSON (один PostDBOut на строку).
+	Посты читаются из бд пачками по POST_STREAM_BATCH_SIZE, первая строка уходит клиенту сразу после первой пачки."""
+	def ndjson() -> Iterator[str]:
+		for db_posts in post.stream_by_user(
+				db, user_id=user_id, batch_size=settings.POST_STREAM_BATCH_SIZE, root_original=root_original
+		):
+			yield "".join(PostDBOut.model_validate(db_post).model_dump_json() + "\n" for db_post in db_posts)
+
+	user_id = current_user.id
+	return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 
 @router.get("/get-posts/{user_id}", response_model=Page[PostDBOut], status_code=status.HTTP_200_OK)
@@ -124,13 +154,29 @@ def get_user_posts(
 		*,
 		db: Annotated[Session, Depends(get_db)],
 		current_user: Annotated[Users, Depends(get_current_user)],
+		background_tasks: BackgroundTasks,
 		user_id: int = Path(description='user id'),
 		page: int = Query(1, ge=1, description="Page number"),
-		size: int = Query(10, ge=1, le=100, description="Page size")
+		size: int = Query(10, ge=1, le=100, description="Page size"),
+		count: TotalMode = Query(TotalMode.exact, description="How to calculate total"),
+		root_original: bool = Query(False, description="Return the root of a repost chain as original_post"),
+		with_engagement: bool = Query(False, description="Embed like count and liked flag of the current user")
 ) -> Any:
 	"""Возвращает посты нужного пользователя с пагинацией."""
 	db_user = user.get(db, id_=user_id)
+	liked_by = current_user.id if with_engagement else None
+	if count == TotalMode.none:
+		db_posts = post.get_page(db, page=page, limit=size, id_=user_id, lookahead=True)
+		db_posts = post.hydrate(db, db_posts, root_original=root_original, liked_by=liked_by)
+		return Page(**lookahead_page_dict(items=db_posts, size=size, page=page))
 	db_posts = post.get_page(db, page=page, limit=size, id_=user_id)
+	db_posts = post.hydrate(db, db_posts, root_original=root_original, liked_by=liked_by)
+	if count == TotalMode.cached:
+		total_posts = page_totals.get(
+			db, key=("posts", user_id), count=lambda session: post.count_posts(session, user_id),
+			background_tasks=background_tasks
+		)
+		return Page(items=db_posts, **page_dict(page=page, size=size, total_posts=total_posts, check_page=False))
 	total_posts = post.count_posts(db, user_id)
 	return Page(items=db_posts, **page_dict(page=page, size=size, total_posts=total_posts))
 
@@ -140,13 +186,48 @@ def get_feeds(
 		*,
 		db: Annotated[Session, Depends(get_db)],
 		current_user: Annotated[Users, Depends(get_current_user)],
+		background_tasks: BackgroundTasks,
 		page: int = Query(1, ge=1, description="Page number"),
-		size: int = Query(10, ge=1, le=100, description="Page size")
+		size: int = Query(10, ge=1, le=100, description="Page size"),
+		cursor: str | None = Query(None, description="next_cursor from previous page, empty value for the first page"),
+		count: TotalMode = Query(TotalMode.exact, description="How to calculate total"),
+		root_original: bool = Query(False, description="Return the root of a repost chain as original_post"),
+		ranked: bool = Query(False, description="Order the feed by score instead of time"),
+		with_engagement: bool = Query(False, description="Embed like count and liked flag of the current user")
 ) -> Any:
-	"""Возвращает посты текущего пользователя и его подписок, с пагинацией. (Лента новостей)"""
-	db_posts = post.get_all_feed(db, page=page, limit=size, id_=current_user.id)
-	total_posts = post.count_feed_posts(db, current_user.id)
-	return Page(items=db_posts, **page_dict(page=page, size=size, total_posts=total_posts))
+	"""Возвращает посты текущего пользователя и его подписок, с пагинацией. (Лента новостей)
+	Лента собирается из материализованной таблицы timeline и постов популярных авторов (см. CRUDFeed).
+	Если передан cursor, то лента отдается через keyset пагинацию без подсчета total.
+	count=none - total не считается, вместо него has_more, count=cached - total из кэша.
+	ranked=True - последние FEED_RANK_WINDOW постов ленты, отсортированные по оценке (cursor и count игнорируются)."""
+	user_id = current_user.id
+	liked_by = user_id if with_engagement else None
+	if ranked:
+		db_posts, total_posts = feed.get_ranked_page(db, page=page, limit=size, owner_id=user_id)
+		db_posts = post.hydrate(db, db_posts, root_original=root_original, liked_by=liked_by)
+		return Page(items=db_posts, **page_dict(page=page, size=size, total_posts=total_posts, check_page=False))
+	if cursor is not None:
+		db_posts = feed.get_by_cursor(
+			db, cursor=decode_cursor(cursor) if cursor else None, limit=size, owner_id=user_id
+		)
+		db_posts = post.hydrate(db, db_posts, root_original=root_original, liked_by=liked_by)
+		return Page(**lookahead_page_dict(items=db_posts, size=size))
+	if count == TotalMode.none:
+		db_posts = feed.get_page(db, page=page, limit=size, owner_id=user_id, lookahead=True)
+		db_posts = post.hydrate(db, db_posts, root_original=root_original, liked_by=liked_by)
+		return Page(**lookahead_page_dict(items=db_posts, size=size, page=page))
+	db_posts = feed.get_page(db, page=page, limit=size, owner_id=user_id)
+	db_posts = post.hydrate(db, db_posts, root_original=root_original, liked_by=liked_by)
+	if count == TotalMode.cached:
+		total_posts = page_totals.get(
+			db, key=("feed", user_id), count=lambda session: feed.count(session, user_id),
+			background_tasks=background_tasks
+		)
+		page_data = page_dict(page=page, size=size, total_posts=total_posts, check_page=False)
+	else:
+		total_posts = feed.count(db, user_id)
+		page_data = page_dict(page=page, size=size, total_posts=total_posts)
+	return Page(items=db_posts, **page_data)
 
 
 @router.post("/{post_id}/comment", response_model=CommentDBOut, status_code=status.HTTP_201_CREATED)
@@ -194,28 +275,44 @@ def delete_comment(
 	return {"success": "Comment has been deleted."}
 
 
-@router.get("/{post_id}/comment", response_model=CommentsDBOut, status_code=status.HTTP_200_OK)
+@router.get("/{post_id}/comment", response_model=Page[CommentDBOutWithReplies], status_code=status.HTTP_200_OK)
 def get_comments(
 		*,
 		db: Annotated[Session, Depends(get_db)],
 		current_user: Annotated[Users, Depends(get_current_user)],
-		post_id: int
+		post_id: int,
+		size: int = Query(20, ge=1, le=100, description="Page size"),
+		cursor: str | None = Query(None, description="next_cursor from previous page, empty value for the first page")
 ) -> Any:
+	"""Возвращает комментарии верхнего уровня к посту, от старых к новым, с keyset пагинацией.
+	Ответы не вкладываются, вместо них replies_count, ветка загружается через /comment/{comment_id}."""
 	db_post = post.get(db, id_=post_id)
-	db_comments = comment.get_object_comments(db, obj_to_comment=db_post)
-	return {"comments": db_comments}
+	db_comments = comment.get_object_comments_by_cursor(
+		db, obj_to_comment=db_post, cursor=decode_cursor(cursor) if cursor else None, limit=size
+	)
+	return Page(**lookahead_page_dict(items=db_comments, size=size))
 
 
-@router.get("/comment/{comment_id}", response_model=CommentDBOutWithComments, status_code=status.HTTP_200_OK)
+@router.get(
+	"/comment/{comment_id}",
+	response_model=CommentDBOutWithComments | CommentsNormalizedOut,
+	status_code=status.HTTP_200_OK
+)
 def get_comment(
 		*,
 		db: Annotated[Session, Depends(get_db)],
 		current_user: Annotated[Users, Depends(get_current_user)],
-		comment_id: int
+		comment_id: int,
+		depth: int | None = Query(None, ge=0, description="How many levels of replies to return, all by default"),
+		normalized: bool = Query(False, description="Flat list of comments and authors in a separate users map")
 ) -> Any:
-	"""Возвращает комментарий по id"""
-	db_comment = comment.get(db, id_=comment_id)
-	return db_comment
+	"""Возвращает комментарий по id вместе с ответами. Ветка читается одним запросом (см. CRUDComment.get_thread).
+	normalized=True - ветка плоским списком, а каждый автор один раз в users, для длинных веток"""
+	if normalized:
+		db_comments, authors = comment.get_thread_flat(db, id_=comment_id, depth=depth)
+		return CommentsNormalizedOut(comments=db_comments, users={a.id: a for a in authors})
+	db_comment = comment.get_thread(db, id_=comment_id, depth=depth)
+	return CommentDBOutWithComments.model_validate(db_comment)
 
 
 @router.post("/{post_id}/like", response_model=LikeDBOut, status_code=status.HTTP_201_CREATED)
@@ -225,8 +322,12 @@ def create_like(
 		current_user: Annotated[Users, Depends(get_current_user)],
 		post_id: int
 ) -> Any:
-	"""Создает лайк для поста"""
+	"""Создает лайк для поста. В режиме LIKES_WRITE_BEHIND лайк только попадает в буфер и запишется
+	в бд позже, поэтому id не возвращается, а повторный лайк не считается ошибкой."""
 	db_post = post.get(db, id_=post_id)
+	if settings.LIKES_WRITE_BEHIND:
+		likes_buffer.append(user_id=current_user.id, entity_type=Post.__name__, entity_id=db_post.id, liked=True)
+		return LikeDBOut(user_id=current_user.id, entity_type=Post.__name__, entity_id=db_post.id)
 	like_obj = LikeCreate(user_id=current_user.id)
 	db_like = likes.create(db, obj_in=like_obj, obj_to_like=db_post)
 	return db_like
@@ -239,8 +340,11 @@ def delete_like(
 		current_user: Annotated[Users, Depends(get_current_user)],
 		post_id: int
 ) -> Any:
-	"""Удаляет лайк с поста"""
+	"""Удаляет лайк с поста. В режиме LIKES_WRITE_BEHIND снятие лайка попадает в буфер."""
 	db_post = post.get(db, id_=post_id)
+	if settings.LIKES_WRITE_BEHIND:
+		likes_buffer.append(user_id=current_user.id, entity_type=Post.__name__, entity_id=db_post.id, liked=False)
+		return {"success": "Like has been deleted."}
 	likes.remove_like(db, obj_to_like=db_post, user_id=current_user.id)
 	return {"success": "Like has been deleted."}
 
@@ -252,17 +356,53 @@ def count_likes(
 		current_user: Annotated[Users, Depends(get_current_user)],
 		post_id: int
 ) -> Any:
-	"""Считает количество лайков на посте"""
+	"""Считает количество лайков на посте. В режиме LIKES_WRITE_BEHIND учитывает еще не записанный
+	лайк текущего пользователя."""
 	db_post = post.get(db, id_=post_id)
+	if settings.LIKES_WRITE_BEHIND:
+		engagement = likes.get_engagement(
+			db, entity_type=Post.__name__, entity_ids=[db_post.id], user_id=current_user.id
+		)
+		return {"count": engagement[db_post.id].count}
 	count = likes.count_likes(db, obj_to_like=db_post)
 	return {"count": count}
 
 
+@router.get("/top", response_model=List[TopPost], status_code=status.HTTP_200_OK)
+def get_top(
+		*,
+		db: Annotated[Session, Depends(get_db)],
+		current_user: Annotated[Users, Depends(get_current_user)],
+		period: LeaderboardPeriod = Query(LeaderboardPeriod.day, description="Leaderboard window"),
+		limit: int = Query(10, ge=1, le=100, description="Number of posts"),
+		with_engagement: bool = Query(False, description="Embed like count and liked flag of the current user")
+) -> Any:
+	"""Возвращает самые лайкнутые посты за текущий день или неделю. Читается из таблицы leaderboard."""
+	top = leaderboard.get_top(db, period=period, entity_type=Post.__name__, limit=limit)
+	db_posts = db.execute(select(Post).where(Post.id.in_([post_id for post_id, _ in top]))).scalars().all()
+	db_posts = post.hydrate(db, db_posts, liked_by=current_user.id if with_engagement else None)
+	db_posts = {p.id: p for p in db_posts}
+	return [TopPost(score=score, post=db_posts[post_id]) for post_id, score in top if post_id in db_posts]
+
+
+@router.get("/engagement", response_model=List[LikesEngagement], status_code=status.HTTP_200_OK)
+def get_engagement(
+		*,
+		db: Annotated[Session, Depends(get_db)],
+		principal: Annotated[TokenData, Depends(get_current_principal)],
+		post_ids: List[int] = Query([], max_length=100, description="Post ids")
+) -> Any:
+	"""Возвращает количество лайков и отметку о лайке текущего пользователя для нескольких постов сразу."""
+	engagement = likes.get_engagement(db, entity_type=Post.__name__, entity_ids=post_ids, user_id=principal.id)
+	return list(engagement.values())
+
+
 @router.get("/{post_id}", response_model=PostDBOut, status_code=status.HTTP_200_OK)
 def get_post(
 		*,
 		db: Annotated[Session, Depends(get_db)],
 		current_user: Annotated[Users, Depends(get_current_user)],
-		post_id: int
+		post_id: int,
+		root_original: bool = Query(False, description="Return the root of a repost chain as original_post")
 ) -> Any:
-	return post.get(db, id_=post_id)
+	return post.hydrate(db, [post.get(db, id_=post_id)], root_original=root_original)[0]
@@ -1,15 +1,22 @@
-from typing import Any, Annotated
+from typing import Any, Annotated, List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_db, get_current_user, get_current_principal
 from app.schemas.users import UserCreate, UserUpdate, UserOut, UserOutWithFollowers, UserOutWithFollowed
+from app.schemas.users import FollowBatch, FollowBatchOut, UserCard, UserSuggestion, Relationship
+from app.schemas.page import Page
+from app.schemas.token import TokenData
 from app.schemas.exceptions import ErrorResponse
 from app.models.users import Users
 from app.crud.crud_user import user
 from app.elastic.elastic_service import get_es, ElasticSearchService
 from app.elastic.documents import UserDoc
+from app.utils.timeline import backfill_timeline, prune_timeline
+from app.utils.page import lookahead_page_dict, decode_cursor
+from app.utils.follow_graph import follow_graph
+from app.core.config import settings
 
 
 router = APIRouter()
@@ -69,8 +76,10 @@ def follow(
 			status_code=status.HTTP_400_BAD_REQUEST,
 			detail=[error_response.model_dump()]
 		)
-	user_db = user.follow(db, user_db=current_user, user_to_follow=user_to_follow)
-	return user_db
+	# лента меняется только если подписка действительно появилась
+	if user.follow_many(db, user_db=current_user, user_ids=[user_to_follow.id]):
+		backfill_timeline.delay(owner_id=current_user.id, author_id=user_to_follow.id)
+	return current_user
 
 
 @router.post("/unfollow/{user_id}", response_model=UserOut, status_code=status.HTTP_200_OK)
@@ -91,8 +100,38 @@ def unfollow(
 			status_code=status.HTTP_400_BAD_REQUEST,
 			detail=[error_response.model_dump()]
 		)
-	user_db = user.unfollow(db, user_db=current_user, user_to_follow=user_to_follow)
-	return user_db
+	if user.unfollow_many(db, user_db=current_user, user_ids=[user_to_follow.id]):
+		prune_timeline.delay(owner_id=current_user.id, author_id=user_to_follow.id)
+	return current_user
+
+
+@router.post("/follow-batch", response_model=FollowBatchOut, status_code=status.HTTP_200_OK)
+def follow_batch(
+		*,
+		db: Annotated[Session, Depends(get_db)],
+		current_user: Annotated[Users, Depends(get_current_user)],
+		obj_in: FollowBatch
+) -> Any:
+	"""Подписка и отписка на нескольких пользователей сразу (например, при онбординге). Каждое направление -
+	один запрос, себя и несуществующих пользователей пропускаем. Ленты обновляются только по реально
+	изменившимся подпискам, они же возвращаются в ответе."""
+	if len(obj_in.follow) + len(obj_in.unfollow) > settings.FOLLOW_BATCH_MAX:
+		error_response = ErrorResponse(
+			loc="follow",
+			msg=f"No more than {settings.FOLLOW_BATCH_MAX} users per request",
+			type="value_error"
+		)
+		raise HTTPException(
+			status_code=status.HTTP_400_BAD_REQUEST,
+			detail=[error_response.model_dump()]
+		)
+	followed = user.follow_many(db, user_db=current_user, user_ids=obj_in.follow) if obj_in.follow else []
+	unfollowed = user.unfollow_many(db, user_db=current_user, user_ids=obj_in.unfollow) if obj_in.unfollow else []
+	for author_id in followed:
+		backfill_timeline.delay(owner_id=current_user.id, author_id=author_id)
+	for author_id in unfollowed:
+		prune_timeline.delay(owner_id=current_user.id, author_id=author_id)
+	return FollowBatchOut(followed=followed, unfollowed=unfollowed)
 
 
 @router.get("/get-followers/{user_id}", response_model=UserOutWithFollowers, status_code=status.HTTP_200_OK)
@@ -102,7 +141,12 @@ def get_followers(
 		db: Annotated[Session, Depends(get_db)],
 		current_user: Annotated[Users, Depends(get_current_user)]
 ) -> Any:
-	return user.get(db, id_=user_id)
+	"""Пользователь с подписчиками, не больше FOLLOW_LIST_CAP. Полный список - /{user_id}/followers"""
+	user_db = user.get(db, id_=user_id)
+	return UserOutWithFollowers(
+		**UserOut.model_validate(user_db).model_dump(),
+		followers=user_db.followers.limit(settings.FOLLOW_LIST_CAP).all()
+	)
 
 
 @router.get("/get-followed/{user_id}", response_model=UserOutWithFollowed, status_code=status.HTTP_200_OK)
@@ -112,7 +156,81 @@ def get_followed(
 		db: Annotated[Session, Depends(get_db)],
 		current_user: Annotated[Users, Depends(get_current_user)]
 ) -> Any:
-	return user.get(db, id_=user_id)
+	"""Пользователь с подписками, не больше FOLLOW_LIST_CAP. Полный список - /{user_id}/following"""
+	user_db = user.get(db, id_=user_id)
+	return UserOutWithFollowed(
+		**UserOut.model_validate(user_db).model_dump(),
+		followed=user_db.followed.limit(settings.FOLLOW_LIST_CAP).all()
+	)
+
+
+@router.get("/{user_id}/followers", response_model=Page[UserCard], status_code=status.HTTP_200_OK)
+def get_followers_page(
+		user_id: int,
+		*,
+		db: Annotated[Session, Depends(get_db)],
+		current_user: Annotated[Users, Depends(get_current_user)],
+		size: int = Query(50, ge=1, le=200, description="Page size"),
+		cursor: str | None = Query(None, description="next_cursor from previous page, empty value for the first page")
+) -> Any:
+	"""Подписчики пользователя от новых к старым с keyset пагинацией. total - из счетчика followers_count"""
+	user_db = user.get(db, id_=user_id)
+	rows = user.get_followers_by_cursor(
+		db, user_id=user_id, cursor=decode_cursor(cursor) if cursor else None, limit=size
+	)
+	return Page(total=user_db.followers_count, **lookahead_page_dict(items=rows, size=size))
+
+
+@router.get("/{user_id}/following", response_model=Page[UserCard], status_code=status.HTTP_200_OK)
+def get_following_page(
+		user_id: int,
+		*,
+		db: Annotated[Session, Depends(get_db)],
+		current_user: Annotated[Users, Depends(get_current_user)],
+		size: int = Query(50, ge=1, le=200, description="Page size"),
+		cursor: str | None = Query(None, description="next_cursor from previous page, empty value for the first page")
+) -> Any:
+	"""Подписки пользователя от новых к старым с keyset пагинацией. total - из счетчика following_count"""
+	user_db = user.get(db, id_=user_id)
+	rows = user.get_following_by_cursor(
+		db, user_id=user_id, cursor=decode_cursor(cursor) if cursor else None, limit=size
+	)
+	return Page(total=user_db.following_count, **lookahead_page_dict(items=rows, size=size))
+
+
+@router.get("/suggestions", response_model=List[UserSuggestion], status_code=status.HTTP_200_OK)
+def get_suggestions(
+		*,
+		db: Annotated[Session, Depends(get_db)],
+		principal: Annotated[TokenData, Depends(get_current_principal)],
+		background_tasks: BackgroundTasks,
+		limit: int = Query(20, ge=1, le=100)
+) -> Any:
+	"""Подсказки "на кого подписаться": на кого подписаны подписки текущего пользователя. Считаются по снимку
+	графа подписок в памяти (см. FollowGraph), из бд подгружаются только карточки найденных пользователей."""
+	follow_graph.ensure(background_tasks=background_tasks)
+	suggested = follow_graph.suggestions(principal.id, limit=limit)
+	cards = user.get_cards(db, ids=[user_id for user_id, _ in suggested])
+	return [
+		UserSuggestion(id=user_id, name=cards[user_id].name, surname=cards[user_id].surname, mutual=mutual)
+		for user_id, mutual in suggested if user_id in cards
+	]
+
+
+@router.get("/relationships", response_model=List[Relationship], status_code=status.HTTP_200_OK)
+def get_relationships(
+		*,
+		db: Annotated[Session, Depends(get_db)],
+		principal: Annotated[TokenData, Depends(get_current_principal)],
+		user_ids: List[int] = Query([], max_length=300, description="User ids")
+) -> Any:
+	"""Подписан ли текущий пользователь на каждого из user_ids и подписан ли каждый на него, одним запросом.
+	Для списков пользователей в клиенте (поиск, подписчики, авторы комментариев)."""
+	relationships = user.get_relationships(db, user_id=principal.id, user_ids=user_ids)
+	return [
+		Relationship(user_id=user_id, following=following, followed_by=followed_by, mutual=following and followed_by)
+		for user_id, (following, followed_by) in relationships.items()
+	]
 
 
 @router.get("/{user_id}", response_model=UserOut, status_code=status.HTTP_200_OK)
@@ -6,11 +6,12 @@ from sqlalchemy.orm import Session
 
 from app.db.session import SessionLocal
 from app.core.security import oauth2_scheme
-from app.core.security import verify_token
+from app.core.security import decode_token
 from app.models.users import Users
 from app.core.config import settings
 from app.schemas.token import TokenData
 from app.crud.crud_user import user
+from app.crud.crud_revoked_token import revoked_token
 
 
 def get_db() -> Generator:
@@ -29,12 +30,24 @@ def get_current_user(
 		detail="Could not validate credentials",
 		headers={"WWW-Authenticate": "Bearer"}
 	)
-	user_id = verify_token(token)
-	current_user = user.get(db, id_=user_id)
+	token_data = get_current_principal(db, token)
+	current_user = user.get_principal(db, id_=token_data.id)
 	if not current_user:
 		raise credentials_exception
 	return current_user
 
 
-
-
+def get_current_principal(
+	db: Annotated[Session, Depends(get_db)], token: Annotated[str, Depends(oauth2_scheme)]
+) -> TokenData:
+	"""Только проверенные claims токена. Для эндпоинтов, которым нужен лишь id текущего пользователя.
+	Отозванный токен отсекается, в бд при этом идем только на совпадение в Bloom фильтре отзывов.
+	Удаленный пользователь с еще живым токеном здесь не отсекается."""
+	token_data = decode_token(token)
+	if revoked_token.is_revoked(db, jti=token_data.jti):
+		raise HTTPException(
+			status_code=status.HTTP_401_UNAUTHORIZED,
+			detail="Token has been revoked",
+			headers={"WWW-Authenticate": "Bearer"}
+		)
+	return token_data
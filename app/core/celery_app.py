@@ -2,5 +2,33 @@ from celery import Celery
 
 from .config import settings
 
-celery = Celery("celery_app", broker=settings.BROKER, backend=settings.BACKEND, include=['app.utils.sendmail'])
+celery = Celery(
+	"celery_app", broker=settings.BROKER, backend=settings.BACKEND,
+	include=[
+		'app.utils.sendmail', 'app.utils.timeline', 'app.utils.counters', 'app.utils.leaderboard',
+		'app.utils.revoked_tokens'
+	]
+)
 celery.conf.acks_late = True
+celery.conf.beat_schedule = {
+	"trim-timelines": {
+		"task": "app.utils.timeline.trim_timelines",
+		"schedule": settings.TIMELINE_TRIM_INTERVAL
+	},
+	"reconcile-counters": {
+		"task": "app.utils.counters.reconcile_counters",
+		"schedule": settings.USER_COUNTERS_RECONCILE_INTERVAL
+	},
+	"refresh-leaderboard": {
+		"task": "app.utils.leaderboard.refresh_leaderboard",
+		"schedule": settings.LEADERBOARD_REFRESH_INTERVAL
+	},
+	"trim-leaderboard": {
+		"task": "app.utils.leaderboard.trim_leaderboard",
+		"schedule": settings.LEADERBOARD_TRIM_INTERVAL
+	},
+	"trim-revoked-tokens": {
+		"task": "app.utils.revoked_tokens.trim_revoked_tokens",
+		"schedule": settings.REVOCATION_TRIM_INTERVAL
+	}
+}
@@ -20,6 +20,17 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     REFRESH_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 10080 minutes -> 7 days
     RESET_PASSWORD_EXPIRE_MINUTES: int = 10
+    TOKEN_CACHE_SIZE: int = 100000
+    REVOCATION_BLOOM_CAPACITY: int = 100000
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    REVOCATION_SYNC_INTERVAL: int = 5  # seconds
+    REVOCATION_SYNC_OVERLAP: int = 60  # seconds
+    REVOCATION_REBUILD_INTERVAL: int = 60 * 60  # seconds
+    REVOCATION_TRIM_INTERVAL: int = 60 * 60  # seconds
+    BCRYPT_ROUNDS: int = 12
+    BCRYPT_PROCESSES: int = 2  # 0 - hash in the calling thread
+    BCRYPT_MAX_PENDING: int = 8  # keep well below the AnyIO threadpool size (40)
+    BCRYPT_STATS_LOG_INTERVAL: int = 60  # seconds
     MAIL_USE_TLS: bool = True
     MAIL_HOST: str | None = None
     MAIL_PORT: int | None = None
@@ -34,6 +45,38 @@ class Settings(BaseSettings):
     STATIC_DIR: str
     BROKER: str
     BACKEND: str
+    TIMELINE_MAX_LENGTH: int = 800
+    TIMELINE_TRIM_INTERVAL: int = 60 * 10  # seconds
+    CELEBRITY_FOLLOWERS_THRESHOLD: int = 10000
+    FOLLOW_BATCH_MAX: int = 100
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL: int = 60  # seconds
+    FOLLOW_LIST_CAP: int = 1000
+    FOLLOW_GRAPH_REFRESH_INTERVAL: int = 60 * 10  # seconds
+    FOLLOW_GRAPH_BUILD_BATCH: int = 100000
+    POST_REPOST_MAX_DEPTH: int = 10
+    PAGE_TOTAL_CACHE_SIZE: int = 10000
+    PAGE_TOTAL_CACHE_TTL: int = 60  # seconds
+    PAGE_TOTAL_CACHE_MAX_AGE: int = 60 * 60  # seconds
+    FEED_RANK_WINDOW: int = 200
+    FEED_RANK_LIKE_WEIGHT: float = 1.0
+    FEED_RANK_COMMENT_WEIGHT: float = 2.0
+    FEED_RANK_HALF_LIFE: int = 60 * 60 * 6  # seconds
+    FEED_RANK_CACHE_SIZE: int = 10000
+    FEED_RANK_CACHE_TTL: int = 60  # seconds
+    POST_STREAM_BATCH_SIZE: int = 500
+    USER_COUNTERS_RECONCILE_INTERVAL: int = 60 * 60  # seconds
+    LIKE_COUNTER_SHARDS: int = 16
+    LIKE_COUNT_CACHE_SIZE: int = 10000
+    LIKE_COUNT_CACHE_TTL: int = 5  # seconds
+    LIKES_WRITE_BEHIND: bool = False
+    LIKES_FLUSH_INTERVAL: int = 5  # seconds
+    LIKES_BUFFER_PATH: str = "/tmp/likes_buffer.log"
+    LIKES_PENDING_CACHE_SIZE: int = 100000
+    LEADERBOARD_KEEP: int = 1000
+    LEADERBOARD_RETENTION_DAYS: int = 14
+    LEADERBOARD_REFRESH_INTERVAL: int = 60  # seconds
+    LEADERBOARD_TRIM_INTERVAL: int = 60 * 10  # seconds
 
 
 settings = Settings()
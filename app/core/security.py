@@ -1,3 +1,7 @@
+import time
+import hashlib
+from uuid import uuid4
+
 from passlib.context import CryptContext
 from datetime import timedelta, datetime
 from jose import jwt, JWTError
@@ -11,32 +15,51 @@ from fastapi.exceptions import HTTPException
 
 from app.core.config import settings
 from app.schemas.token import TokenData
+from app.utils.hashing_pool import hashing_pool
+from app.utils.cache import TTLCache
+
+# Уже проверенные токены: sha256 токена -> TokenData. Запись истекает вместе с токеном, в кэше лежит только
+# дайджест, поэтому сам токен в памяти процесса не хранится
+verified_tokens = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
 
 
 def get_password_hash(password: str) -> str:
-	"""С помощью метода класса CryptContext создаем хэш пароля"""
-	return PWD_CONTEXT.hash(password)
+	"""С помощью метода класса CryptContext создаем хэш пароля. Считается в пуле процессов hashing_pool"""
+	return hashing_pool.run(_hash, password)
 
 
 def verify_password(*, password: str, hashed_password: str) -> bool:
-	"""Верифицируем пароль."""
+	"""Верифицируем пароль. Считается в пуле процессов hashing_pool"""
+	return hashing_pool.run(_verify, password, hashed_password)
+
+
+def password_needs_update(hashed_password: str) -> bool:
+	"""Хэш посчитан устаревшей схемой или с другим BCRYPT_ROUNDS. Проверка без хэширования, по заголовку хэша"""
+	return PWD_CONTEXT.needs_update(hashed_password)
+
+
+def _hash(password: str) -> str:
+	return PWD_CONTEXT.hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
 	return PWD_CONTEXT.verify(password, hashed_password)
 
 
 def create_access_token(subject: int) -> str:
-	"""Создание токена доступа. В тело токена зашивается user_id"""
+	"""Создание токена доступа. В тело токена зашивается user_id и jti - id токена для отзыва"""
 	now = datetime.utcnow()
 	expire = now + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-	to_encode = {"exp": expire, "sub": str(subject), "type": "access_token"}
+	to_encode = {"exp": expire, "sub": str(subject), "type": "access_token", "jti": uuid4().hex}
 	encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, settings.JWT_ALGORITHM)
 	return encoded_jwt
 
 
 def create_refresh_token(subject: int) -> str:
-	"""Создание refresh token. В тело токена зашивается user_id"""
+	"""Создание refresh token. В тело токена зашивается user_id и jti - id токена для отзыва и ротации"""
 	now = datetime.utcnow()
 	expire = now + timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
-	to_encode = {"exp": expire, "sub": str(subject), "type": "refresh_token"}
+	to_encode = {"exp": expire, "sub": str(subject), "type": "refresh_token", "jti": uuid4().hex}
 	encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, settings.JWT_ALGORITHM)
 	return encoded_jwt
 
@@ -60,21 +83,40 @@ def verify_password_reset_token(token: str) -> str | None:
 
 
 def verify_token(token: str) -> int:
-	"""Проверяем токен. На выходе получаем либо id который был зашит в токен либо raise"""
+	"""Проверяем токен доступа. На выходе получаем либо id который был зашит в токен либо raise"""
+	return decode_token(token).id
+
+
+def decode_token(token: str | None, *, token_type: str = "access_token") -> TokenData:
+	"""Проверяем подпись, срок и тип токена. На выходе claims токена либо raise. Отзыв здесь не проверяется,
+	это делают зависимости с доступом к бд (см. CRUDRevokedToken.is_revoked)"""
 	credentials_exception = HTTPException(
 		status_code=status.HTTP_401_UNAUTHORIZED,
 		detail="Could not validate credentials",
 		headers={"WWW-Authenticate": "Bearer"}
 	)
-	try:
-		payload = jwt.decode(token, settings.JWT_SECRET, settings.JWT_ALGORITHM)
+	if not token:
+		raise credentials_exception
+	key = hashlib.sha256(token.encode()).digest()
+	token_data = verified_tokens.get(key)
+	if token_data is None:
+		try:
+			payload = jwt.decode(token, settings.JWT_SECRET, settings.JWT_ALGORITHM)
+		except JWTError:
+			raise credentials_exception
 		user_id: str = payload.get("sub")
-		if not user_id:
+		if not user_id or payload.get("type") not in ("access_token", "refresh_token"):
 			raise credentials_exception
-		token_data = TokenData(id=user_id)
-		return token_data.id
-	except JWTError:
+		# у токенов, выданных до появления jti, вместо него берется дайджест самого токена
+		jti = payload.get("jti") or key.hex()[:32]
+		token_data = TokenData(id=user_id, jti=jti, type=payload["type"], exp=payload.get("exp"))
+		# запись живет ровно до exp токена, после этого токен снова проходит полную проверку и будет отклонен
+		ttl = (token_data.exp or 0) - time.time()
+		if ttl > 0:
+			verified_tokens.set(key, token_data, ttl=ttl)
+	if token_data.type != token_type:
 		raise credentials_exception
+	return token_data
 
 
 class OAuth2PasswordCookieBearer(OAuth2PasswordBearer):
@@ -91,5 +133,5 @@ class OAuth2PasswordCookieBearer(OAuth2PasswordBearer):
 		return authorization
 
 
-PWD_CONTEXT = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PWD_CONTEXT = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/login")
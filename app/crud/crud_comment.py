@@ -1,7 +1,10 @@
-from typing import TypeVar, List
+from collections import defaultdict
+from datetime import datetime
+from typing import TypeVar, List, Tuple, Dict
 
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy.orm import Session, lazyload, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import select, or_, func, tuple_
 
 from fastapi import HTTPException, status
 
@@ -40,21 +43,109 @@ class CRUDComment(CRUDBase[Comment, CommentDBCreate, CommentDBUpdate]):
 			obj_in: CommentDBCreate,
 			obj_to_comment: T = None
 	) -> Comment:
+		"""Создает комментарий и проставляет ему материализованный путь: путь родителя плюс свой id.
+		id известен только после INSERT, поэтому путь дописывается после flush в той же транзакции.
+		Родительский комментарий должен относиться к той же сущности, иначе ветка разъедется по двум объектам"""
+		parent = None
+		if obj_in.parent_comment_id is not None:
+			parent = self.get(db, id_=obj_in.parent_comment_id)
+			if (parent.commentable_type, parent.commentable_id) != (type(obj_to_comment).__name__, obj_to_comment.id):
+				error_response = ErrorResponse(
+					loc="parent_comment_id",
+					msg="The parent comment belongs to another object",
+					type="value_error"
+				)
+				raise HTTPException(
+					status_code=status.HTTP_400_BAD_REQUEST,
+					detail=[error_response.model_dump()]
+				)
 		db_comment = self.model(**obj_in.model_dump())
 		db_comment.commentable = obj_to_comment
 		db.add(db_comment)
+		db.flush()
+		db_comment.path = f"{parent.path if parent else ''}{db_comment.id}."
+		db_comment.depth = parent.depth + 1 if parent else 0
 		db.commit()
 		return db_comment
 
-	def get_object_comments(
+	def get_thread(self, db: Session, *, id_: int, depth: int | None = None) -> Comment:
+		"""Комментарий со всем поддеревом (или только depth уровней под ним) и цепочкой предков.
+		Поддерево читается одним запросом по префиксу path (индекс ix_comment_path), авторы - через join,
+		дерево собирается в памяти через set_committed_value, поэтому при сериализации запросов больше нет"""
+		root = self._get_root(db, id_=id_)
+		stmt = self._thread_stmt(root, depth).options(joinedload(self.model.author))
+		loaded = {c.id: c for c in db.execute(stmt).unique().scalars()}
+		children = defaultdict(list)
+		for db_comment in loaded.values():
+			set_committed_value(db_comment, "parent_comment", loaded.get(db_comment.parent_comment_id))
+			if db_comment.depth > root.depth:
+				children[db_comment.parent_comment_id].append(db_comment)
+		# у предков child_comments не трогаем, они отдаются только как parent_comment
+		for db_comment in loaded.values():
+			if db_comment.depth >= root.depth:
+				set_committed_value(db_comment, "child_comments", children[db_comment.id])
+		return root
+
+	def get_thread_flat(self, db: Session, *, id_: int, depth: int | None = None) -> Tuple[List[Comment], List[Users]]:
+		"""Та же ветка, что и в get_thread, но плоским списком без вложенности. Авторы не подгружаются
+		к каждому комментарию, а возвращаются отдельно без повторов одним запросом по id"""
+		root = self._get_root(db, id_=id_)
+		db_comments = db.execute(self._thread_stmt(root, depth)).scalars().all()
+		author_ids = {c.user_id for c in db_comments}
+		authors = db.execute(select(Users).where(Users.id.in_(author_ids))).scalars().all()
+		return db_comments, authors
+
+	def _get_root(self, db: Session, *, id_: int) -> Comment:
+		"""Корень ветки без загрузки ответов через relationship"""
+		stmt = select(self.model).where(self.model.id == id_).options(lazyload(self.model.child_comments))
+		root = db.execute(stmt).scalar_one_or_none()
+		return root if root else self.get(db, id_=id_)
+
+	def _thread_stmt(self, root: Comment, depth: int | None):
+		"""Запрос поддерева root по префиксу path (индекс ix_comment_path) вместе с цепочкой предков,
+		от верхних уровней к нижним"""
+		_subtree = self.model.path.startswith(root.path)
+		if depth is not None:
+			_subtree = _subtree & (self.model.depth <= root.depth + depth)
+		ancestors = [int(ancestor_id) for ancestor_id in root.path.split(".")[:-2]]
+		return select(self.model).where(or_(_subtree, self.model.id.in_(ancestors))).\
+			options(lazyload(self.model.child_comments)).\
+			order_by(self.model.depth, self.model.created_at, self.model.id)
+
+	def get_object_comments_by_cursor(
 			self,
 			db: Session,
 			*,
-			obj_to_comment: T
-	) -> List[Comment] | None:
+			obj_to_comment: T,
+			cursor: Tuple[datetime, int] | None,
+			limit: int
+	) -> List[Comment]:
+		"""Комментарии верхнего уровня сущности от старых к новым с keyset пагинацией по (created_at, id).
+		Возвращает limit + 1 комментариев, у каждого в replies_count количество прямых ответов"""
 		stmt = select(self.model).where(
-			self.model.commentable == obj_to_comment, self.model.parent_comment_id.is_(None))
-		return db.execute(stmt).scalars().all()
+			self.model.commentable_type == type(obj_to_comment).__name__,
+			self.model.commentable_id == obj_to_comment.id,
+			self.model.parent_comment_id.is_(None)
+		).options(lazyload(self.model.child_comments), joinedload(self.model.author))
+		if cursor:
+			stmt = stmt.where(tuple_(self.model.created_at, self.model.id) > tuple_(*cursor))
+		stmt = stmt.order_by(self.model.created_at, self.model.id).limit(limit + 1)
+		db_comments = db.execute(stmt).scalars().all()
+		replies = self.count_replies(db, obj_to_comment=obj_to_comment, ids=[c.id for c in db_comments])
+		for db_comment in db_comments:
+			db_comment.replies_count = replies.get(db_comment.id, 0)
+		return db_comments
+
+	def count_replies(self, db: Session, *, obj_to_comment: T, ids: List[int]) -> Dict[int, int]:
+		"""Количество прямых ответов на комментарии ids одним сгруппированным запросом"""
+		if not ids:
+			return {}
+		stmt = select(self.model.parent_comment_id, func.count("*")).where(
+			self.model.commentable_type == type(obj_to_comment).__name__,
+			self.model.commentable_id == obj_to_comment.id,
+			self.model.parent_comment_id.in_(ids)
+		).group_by(self.model.parent_comment_id)
+		return dict(db.execute(stmt).all())
 
 
 comment = CRUDComment(Comment)
@@ -0,0 +1,167 @@
+import heapq
+from datetime import datetime
+from typing import List, Tuple, Iterable
+
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, union, Subquery
+
+from app.crud.base import CRUDBase
+from app.crud.crud_post import post
+from app.crud.crud_timeline import timeline
+from app.models.post import Post
+from app.models.timeline import Timeline
+from app.models.likes import Likes
+from app.models.comment import Comment
+from app.models.users import Users, following
+from app.schemas.post import PostDBCreate, PostUpdate
+from app.utils.cache import TTLCache
+from app.core.config import settings
+
+# Порядок ранжированной ленты пользователя (список id постов), живет FEED_RANK_CACHE_TTL секунд
+ranked_cache = TTLCache(maxsize=settings.FEED_RANK_CACHE_SIZE, ttl=settings.FEED_RANK_CACHE_TTL)
+
+
+class CRUDFeed(CRUDBase[Post, PostDBCreate, PostUpdate]):
+	"""Сборка ленты новостей по гибридной схеме push/pull. Посты обычных авторов при создании раскладываются
+	по лентам подписчиков (таблица timeline), посты популярных авторов (CELEBRITY_FOLLOWERS_THRESHOLD подписчиков
+	и больше) в чужие ленты не пишутся, а дочитываются при запросе ленты. Оба источника сливаются по (created_at, id)."""
+
+	def is_celebrity(self, db: Session, *, user_id: int) -> bool:
+		"""Автор считается популярным, если у него не меньше CELEBRITY_FOLLOWERS_THRESHOLD подписчиков"""
+		followers = db.execute(select(Users.followers_count).where(Users.id == user_id)).scalar_one_or_none()
+		return (followers or 0) >= settings.CELEBRITY_FOLLOWERS_THRESHOLD
+
+	def followed_celebrities(self, owner_id: int) -> Subquery:
+		"""Подзапрос с id популярных авторов, на которых подписан owner_id"""
+		return select(following.c.follower_id.label("id")).\
+			join(Users, Users.id == following.c.follower_id).where(
+				following.c.followed_id == owner_id,
+				Users.followers_count >= settings.CELEBRITY_FOLLOWERS_THRESHOLD
+			).subquery()
+
+	def push(self, db: Session, *, post_obj: Post) -> int:
+		"""Fan-out нового поста. У популярного автора пост попадает только в его собственную ленту"""
+		include_followers = not self.is_celebrity(db, user_id=post_obj.user_id)
+		return timeline.fan_out(db, post_obj=post_obj, include_followers=include_followers)
+
+	@staticmethod
+	def _merge(sources: Iterable[List[Post]], limit: int) -> List[Post]:
+		"""k-way слияние уже отсортированных по (created_at, id) убыванию источников. Пост популярного автора
+		может лежать и в timeline (если автор стал популярным позже), поэтому дубли отбрасываются"""
+		merged = []
+		seen = set()
+		for db_post in heapq.merge(*sources, key=lambda p: (p.created_at, p.id), reverse=True):
+			if db_post.id in seen:
+				continue
+			seen.add(db_post.id)
+			merged.append(db_post)
+			if len(merged) == limit:
+				break
+		return merged
+
+	def get_by_cursor(
+			self,
+			db: Session,
+			*,
+			cursor: Tuple[datetime, int] | None,
+			limit: int,
+			owner_id: int
+	) -> List[Post]:
+		"""Лента owner_id с keyset пагинацией. Возвращает limit + 1 постов"""
+		pushed = timeline.get_by_cursor(db, cursor=cursor, limit=limit, owner_id=owner_id)
+		pulled = post.get_by_authors_cursor(
+			db, cursor=cursor, limit=limit, authors=self.followed_celebrities(owner_id)
+		)
+		return self._merge([pushed, pulled], limit + 1)
+
+	def get_page(self, db: Session, *, page: int, limit: int, owner_id: int, lookahead: bool = False) -> List[Post]:
+		"""Лента owner_id, разбитая на страницы. OFFSET и LIMIT считаются в бд, в память попадает только страница.
+		lookahead=True - дополнительно вернуть первый пост следующей страницы, чтобы узнать есть ли она"""
+		head = page * limit + 1 if lookahead else page * limit
+		ids = self._ids(owner_id, head=head)
+		stmt = select(Post).join(ids, Post.id == ids.c.id).order_by(ids.c.created_at.desc(), ids.c.id.desc()).\
+			offset((page - 1) * limit).limit(head - (page - 1) * limit)
+		return db.execute(stmt).scalars().all()
+
+	def count(self, db: Session, owner_id: int) -> int:
+		"""Количество постов в ленте owner_id: timeline плюс посты популярных авторов, каждый пост один раз"""
+		return db.execute(select(func.count("*")).select_from(self._ids(owner_id))).scalar_one()
+
+	def _ids(self, owner_id: int, *, head: int | None = None) -> Subquery:
+		"""Подзапрос (id, created_at) постов ленты owner_id из обоих источников. Пост популярного автора
+		может лежать и в timeline (если автор стал популярным позже), такие дубли убирает UNION.
+		head - из каждого источника берутся только первые head постов, по диапазону индекса"""
+		authors = self.followed_celebrities(owner_id)
+		pushed = select(Timeline.post_id.label("id"), Timeline.created_at).where(Timeline.owner_id == owner_id)
+		pulled = select(Post.id, Post.created_at).join(authors, Post.user_id == authors.c.id)
+		if head is not None:
+			pushed = pushed.order_by(Timeline.created_at.desc(), Timeline.post_id.desc()).limit(head)
+			pulled = pulled.order_by(Post.created_at.desc(), Post.id.desc()).limit(head)
+		return union(pushed, pulled).subquery()
+
+	@staticmethod
+	def _counts(db: Session, *, column, type_column, entity_type: str, ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+		"""Количество строк на каждый id одним GROUP BY. Возвращает массивы (id, количество)"""
+		stmt = select(column, func.count("*")).where(type_column == entity_type, column.in_(ids)).group_by(column)
+		rows = db.execute(stmt).all()
+		if not rows:
+			return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+		return np.array(rows, dtype=np.int64).T
+
+	@staticmethod
+	def _features(ids: np.ndarray, feature_ids: np.ndarray, feature_counts: np.ndarray) -> np.ndarray:
+		"""Раскладываем счетчики по позициям кандидатов. ids - id кандидатов, без дублей"""
+		values = np.zeros(len(ids), dtype=np.float64)
+		if len(feature_ids):
+			order = np.argsort(ids)
+			values[order[np.searchsorted(ids, feature_ids, sorter=order)]] = feature_counts
+		return values
+
+	@staticmethod
+	def score(*, likes: np.ndarray, comments: np.ndarray, age: np.ndarray) -> np.ndarray:
+		"""Оценка кандидатов за один проход: вес вовлеченности (лайки и комментарии в логарифмической шкале),
+		умноженный на экспоненциальное затухание по возрасту поста с периодом полураспада FEED_RANK_HALF_LIFE"""
+		engagement = 1.0 + settings.FEED_RANK_LIKE_WEIGHT * np.log1p(likes) + \
+			settings.FEED_RANK_COMMENT_WEIGHT * np.log1p(comments)
+		decay = np.exp2(-np.maximum(age, 0.0) / settings.FEED_RANK_HALF_LIFE)
+		return engagement * decay
+
+	def ranked_ids(self, db: Session, *, owner_id: int) -> List[int]:
+		"""Порядок ранжированной ленты owner_id. Кандидаты - последние FEED_RANK_WINDOW постов ленты,
+		признаки для всех кандидатов подтягиваются двумя запросами. Результат кэшируется на FEED_RANK_CACHE_TTL"""
+		ranked = ranked_cache.get(owner_id)
+		if ranked is not None:
+			return ranked
+		candidates = self.get_page(db, page=1, limit=settings.FEED_RANK_WINDOW, owner_id=owner_id)
+		if not candidates:
+			ranked_cache.set(owner_id, [])
+			return []
+		ids = np.fromiter((p.id for p in candidates), dtype=np.int64, count=len(candidates))
+		created_at = np.array([p.created_at for p in candidates], dtype="datetime64[us]")
+		age = (np.datetime64(datetime.utcnow(), "us") - created_at) / np.timedelta64(1, "s")
+		id_list = ids.tolist()
+		likes = self._features(ids, *self._counts(
+			db, column=Likes.entity_id, type_column=Likes.entity_type, entity_type="Post", ids=id_list
+		))
+		comments = self._features(ids, *self._counts(
+			db, column=Comment.commentable_id, type_column=Comment.commentable_type, entity_type="Post", ids=id_list
+		))
+		scores = self.score(likes=likes, comments=comments, age=age)
+		# Кандидаты уже отсортированы от новых к старым, stable сортировка оставляет новые выше при равной оценке
+		ranked = ids[np.argsort(-scores, kind="stable")].tolist()
+		ranked_cache.set(owner_id, ranked)
+		return ranked
+
+	def get_ranked_page(self, db: Session, *, page: int, limit: int, owner_id: int) -> Tuple[List[Post], int]:
+		"""Страница ранжированной ленты owner_id и общее количество постов в ней"""
+		ranked = self.ranked_ids(db, owner_id=owner_id)
+		page_ids = ranked[(page - 1) * limit:page * limit]
+		if not page_ids:
+			return [], len(ranked)
+		posts = {p.id: p for p in db.execute(select(Post).where(Post.id.in_(page_ids))).scalars()}
+		# Пост мог быть удален после того как порядок попал в кэш
+		return [posts[id_] for id_ in page_ids if id_ in posts], len(ranked)
+
+
+feed = CRUDFeed(Post)
@@ -0,0 +1,93 @@
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, delete, literal
+from sqlalchemy.dialects.postgresql import insert
+
+from app.crud.base import CRUDBase
+from app.models.leaderboard import Leaderboard
+from app.models.likes import Likes
+from app.schemas.leaderboard import LeaderboardCreate, LeaderboardUpdate, LeaderboardPeriod
+from app.core.config import settings
+
+PERIOD_DAYS = {LeaderboardPeriod.day: 1, LeaderboardPeriod.week: 7}
+
+
+class CRUDLeaderboard(CRUDBase[Leaderboard, LeaderboardCreate, LeaderboardUpdate]):
+	"""Топ сущностей по лайкам за день и за неделю. Лайк в своей транзакции топ не трогает: задача
+	refresh_leaderboard раз в LEADERBOARD_REFRESH_INTERVAL секунд пересчитывает текущие окна по likes.created_at,
+	поэтому топ отстает от лайков на этот интервал, а чтение топа - это диапазон индекса, а не GROUP BY по likes.
+	В каждое окно пишется не больше LEADERBOARD_KEEP первых сущностей"""
+
+	@staticmethod
+	def bucket(period: LeaderboardPeriod, day: date) -> date:
+		"""Первый день окна period, в которое попадает day. Неделя начинается с понедельника"""
+		if period == LeaderboardPeriod.week:
+			return day - timedelta(days=day.weekday())
+		return day
+
+	def get_top(
+			self,
+			db: Session,
+			*,
+			period: LeaderboardPeriod,
+			entity_type: str,
+			limit: int,
+			day: date | None = None
+	) -> List[Tuple[int, int]]:
+		"""Первые limit сущностей окна period, в которое попадает day (по умолчанию сегодня). Пары (entity_id, score)"""
+		bucket = self.bucket(period, day or datetime.utcnow().date())
+		stmt = select(self.model.entity_id, self.model.score).where(
+			self.model.period == period.value,
+			self.model.bucket == bucket,
+			self.model.entity_type == entity_type,
+			self.model.score > 0
+		).order_by(self.model.score.desc(), self.model.entity_id.desc()).limit(limit)
+		return [tuple(row) for row in db.execute(stmt)]
+
+	def refresh(self, db: Session) -> int:
+		"""Пересчитываем текущие окна всех периодов"""
+		today = datetime.utcnow().date()
+		return sum(self.rebuild(db, period=period, day=today) for period in LeaderboardPeriod)
+
+	def rebuild(self, db: Session, *, period: LeaderboardPeriod, day: date) -> int:
+		"""Пересчитываем окно period, в которое попадает day, с нуля по likes.created_at (диапазон индекса
+		ix_likes_created_at_entity_type_entity_id). Пишутся только первые LEADERBOARD_KEEP сущностей каждого типа.
+		Старое окно заменяется в одной транзакции, читатели до коммита видят его целиком"""
+		bucket = self.bucket(period, day)
+		start = datetime.combine(bucket, datetime.min.time())
+		db.execute(delete(self.model).where(self.model.period == period.value, self.model.bucket == bucket))
+		_counts = select(
+			Likes.entity_type, Likes.entity_id, func.count("*").label("score")
+		).where(
+			Likes.created_at >= start, Likes.created_at < start + timedelta(days=PERIOD_DAYS[period])
+		).group_by(Likes.entity_type, Likes.entity_id).subquery()
+		_ranked = select(
+			_counts,
+			func.row_number().over(
+				partition_by=_counts.c.entity_type, order_by=(_counts.c.score.desc(), _counts.c.entity_id.desc())
+			).label("rn")
+		).subquery()
+		_select = select(
+			literal(period.value), literal(bucket), _ranked.c.entity_type, _ranked.c.entity_id, _ranked.c.score
+		).where(_ranked.c.rn <= settings.LEADERBOARD_KEEP)
+		stmt = insert(self.model).from_select(["period", "bucket", "entity_type", "entity_id", "score"], _select)
+		# пересчет того же окна, начатый параллельно, мог успеть вставить свои строки
+		stmt = stmt.on_conflict_do_update(
+			index_elements=[self.model.period, self.model.bucket, self.model.entity_type, self.model.entity_id],
+			set_={"score": stmt.excluded.score}
+		)
+		inserted = db.execute(stmt).rowcount
+		db.commit()
+		return inserted
+
+	def trim(self, db: Session) -> int:
+		"""Удаляем окна старше LEADERBOARD_RETENTION_DAYS"""
+		oldest = datetime.utcnow().date() - timedelta(days=settings.LEADERBOARD_RETENTION_DAYS)
+		deleted = db.execute(delete(self.model).where(self.model.bucket < oldest)).rowcount
+		db.commit()
+		return deleted
+
+
+leaderboard = CRUDLeaderboard(Leaderboard)
@@ -1,18 +1,29 @@
-from typing import TypeVar
+import random
+from collections import Counter
+from typing import TypeVar, Dict, List, Tuple
 
 from fastapi import HTTPException, status
 
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from sqlalchemy import select, func, delete, tuple_
+from sqlalchemy.dialects.postgresql import insert
 
 from app.crud.base import CRUDBase
 from app.models.likes import Likes
-from app.schemas.like import LikeCreate, LikeUpdate
+from app.models.like_counter import LikeCounter
+from app.models.users import Users
+from app.schemas.like import LikeCreate, LikeUpdate, LikesEngagement
 from app.db.base_class import Base
 from app.schemas.exceptions import ErrorResponse
+from app.utils.cache import TTLCache
+from app.utils.likes_buffer import likes_buffer
+from app.core.config import settings
 
 T = TypeVar('T', bound=Base)
 
+# Количество лайков сущности, ключ (entity_type, entity_id)
+like_counts = TTLCache(maxsize=settings.LIKE_COUNT_CACHE_SIZE, ttl=settings.LIKE_COUNT_CACHE_TTL)
+
 
 class CRUDLikes(CRUDBase[Likes, LikeCreate, LikeUpdate]):
 	def get_before_create(self, db: Session, *, obj_to_like: T, user_id: int) -> Likes | None:
@@ -29,8 +40,15 @@ class CRUDLikes(CRUDBase[Likes, LikeCreate, LikeUpdate]):
 			obj_in: LikeCreate,
 			obj_to_like: T = None
 	) -> Likes | None:
-		"""Проверяю нет ли такого лайка, если нет то создаю запись"""
-		if self.get_before_create(db, obj_to_like=obj_to_like, user_id=obj_in.user_id):
+		"""Создаю лайк одним INSERT ... ON CONFLICT DO NOTHING RETURNING по уникальному индексу
+		(entity_type, entity_id, user_id). Если строка не вернулась, значит лайк уже есть"""
+		stmt = insert(self.model).values(
+			**obj_in.model_dump(), entity_type=type(obj_to_like).__name__, entity_id=obj_to_like.id
+		).on_conflict_do_nothing(
+			index_elements=[self.model.entity_type, self.model.entity_id, self.model.user_id]
+		).returning(self.model)
+		db_like = db.execute(stmt).scalar_one_or_none()
+		if not db_like:
 			error_response = ErrorResponse(
 				loc="obj_to_like",
 				msg="You are already liked this entity",
@@ -40,9 +58,7 @@ class CRUDLikes(CRUDBase[Likes, LikeCreate, LikeUpdate]):
 				status_code=status.HTTP_400_BAD_REQUEST,
 				detail=[error_response.model_dump()]
 			)
-		db_like = self.model(**obj_in.model_dump())
-		db_like.entity = obj_to_like
-		db.add(db_like)
+		self.shift_counter(db, obj_to_like=obj_to_like, delta=1)
 		db.commit()
 		return db_like
 
@@ -53,9 +69,13 @@ class CRUDLikes(CRUDBase[Likes, LikeCreate, LikeUpdate]):
 			obj_to_like: T,
 			user_id: int
 	) -> dict | None:
-		"""проверяю есть ли такой лайк, если есть то удаляю"""
-		db_like = self.get_before_create(db, obj_to_like=obj_to_like, user_id=user_id)
-		if not db_like:
+		"""Удаляю лайк одним DELETE ... RETURNING. Если строка не вернулась, значит лайка не было"""
+		stmt = delete(self.model).where(
+			self.model.entity_type == type(obj_to_like).__name__,
+			self.model.entity_id == obj_to_like.id,
+			self.model.user_id == user_id
+		).returning(self.model.id)
+		if db.execute(stmt).scalar_one_or_none() is None:
 			error_response = ErrorResponse(
 				loc="obj_to_like",
 				msg="The like with this id does not exists",
@@ -65,25 +85,117 @@ class CRUDLikes(CRUDBase[Likes, LikeCreate, LikeUpdate]):
 				status_code=status.HTTP_400_BAD_REQUEST,
 				detail=[error_response.model_dump()]
 			)
-		db.delete(db_like)
+		self.shift_counter(db, obj_to_like=obj_to_like, delta=-1)
 		db.commit()
 		return {"status": "Deleted"}
 
+	@classmethod
+	def shift_counter(cls, db: Session, *, obj_to_like: T, delta: int) -> None:
+		"""Сдвигаем на delta случайный shard счетчика лайков сущности (upsert). Коммит на вызывающем,
+		чтобы счетчик менялся в одной транзакции с лайком"""
+		cls.shift_counters(db, deltas={(type(obj_to_like).__name__, obj_to_like.id): delta})
+
+	@staticmethod
+	def shift_counters(db: Session, *, deltas: Dict[Tuple[str, int], int]) -> None:
+		"""Сдвигаем счетчики нескольких сущностей одним многострочным upsert, ключ deltas - (entity_type, entity_id)"""
+		deltas = {key: delta for key, delta in deltas.items() if delta}
+		if not deltas:
+			return
+		stmt = insert(LikeCounter).values([
+			{
+				"entity_type": entity_type,
+				"entity_id": entity_id,
+				"shard": random.randrange(settings.LIKE_COUNTER_SHARDS),
+				"count": delta
+			}
+			for (entity_type, entity_id), delta in deltas.items()
+		])
+		stmt = stmt.on_conflict_do_update(
+			index_elements=[LikeCounter.entity_type, LikeCounter.entity_id, LikeCounter.shard],
+			set_={"count": LikeCounter.count + stmt.excluded.count}
+		)
+		db.execute(stmt)
+		for key in deltas:
+			like_counts.pop(key)
+
+	def apply_intents(self, db: Session, *, intents: Dict[Tuple[int, str, int], bool]) -> int:
+		"""Записываем пачку намерений из write-behind буфера: ключ (user_id, entity_type, entity_id),
+		True - лайк, False - снятие лайка. Независимо от размера пачки это проверка пользователей, один многострочный
+		INSERT ... ON CONFLICT DO NOTHING, один DELETE и один upsert счетчиков по тем строкам, которые действительно
+		изменились. Возвращает число таких строк"""
+		to_like = [key for key, liked in intents.items() if liked]
+		to_unlike = [key for key, liked in intents.items() if not liked]
+		deltas = Counter()
+		if to_like:
+			# пользователь мог удалиться, пока лайк ждал записи. Иначе вся пачка упадет на внешнем ключе
+			users = set(db.execute(select(Users.id).where(Users.id.in_({key[0] for key in to_like}))).scalars())
+			to_like = [key for key in to_like if key[0] in users]
+		if to_like:
+			stmt = insert(self.model).values([
+				{"user_id": user_id, "entity_type": entity_type, "entity_id": entity_id}
+				for user_id, entity_type, entity_id in to_like
+			]).on_conflict_do_nothing(
+				index_elements=[self.model.entity_type, self.model.entity_id, self.model.user_id]
+			).returning(self.model.entity_type, self.model.entity_id)
+			deltas.update(tuple(row) for row in db.execute(stmt))
+		if to_unlike:
+			stmt = delete(self.model).where(
+				tuple_(self.model.user_id, self.model.entity_type, self.model.entity_id).in_(to_unlike)
+			).returning(self.model.entity_type, self.model.entity_id).execution_options(synchronize_session=False)
+			deltas.subtract(tuple(row) for row in db.execute(stmt))
+		self.shift_counters(db, deltas=deltas)
+		db.commit()
+		return sum(abs(delta) for delta in deltas.values())
+
 	def count_likes(
 			self,
 			db: Session,
 			*,
 			obj_to_like: T
 	) -> int:
-		"""Делаем подсчет лайков у сущности"""
-		stmt = select(func.count("*")).select_from(self.model).where(self.model.entity == obj_to_like)
-		return db.execute(stmt).scalar_one()
-
-
-likes = CRUDLikes(Likes)
-
-
-
+		"""Количество лайков у сущности - сумма не больше LIKE_COUNTER_SHARDS строк like_counter по первичному ключу.
+		Результат кэшируется на LIKE_COUNT_CACHE_TTL секунд"""
+		key = (type(obj_to_like).__name__, obj_to_like.id)
+		count = like_counts.get(key)
+		if count is None:
+			stmt = select(func.coalesce(func.sum(LikeCounter.count), 0)).where(
+				LikeCounter.entity_type == key[0], LikeCounter.entity_id == key[1]
+			)
+			count = db.execute(stmt).scalar_one()
+			like_counts.set(key, count)
+		return count
 
+	def get_engagement(
+			self,
+			db: Session,
+			*,
+			entity_type: str,
+			entity_ids: List[int],
+			user_id: int
+	) -> Dict[int, LikesEngagement]:
+		"""Количество лайков и отметка "лайкнул ли user_id" для пачки сущностей одним сгруппированным запросом
+		по like_counter. Сущности без лайков тоже попадают в результат (count=0, liked=False).
+		В режиме LIKES_WRITE_BEHIND поверх накладываются еще не записанные лайки user_id"""
+		result = {id_: LikesEngagement(entity_id=id_, count=0, liked=False) for id_ in entity_ids}
+		if not entity_ids:
+			return result
+		_liked = select(self.model.entity_id).where(
+			self.model.entity_type == entity_type,
+			self.model.entity_id.in_(entity_ids),
+			self.model.user_id == user_id
+		)
+		stmt = select(
+			LikeCounter.entity_id,
+			func.sum(LikeCounter.count),
+			LikeCounter.entity_id.in_(_liked)
+		).where(
+			LikeCounter.entity_type == entity_type, LikeCounter.entity_id.in_(entity_ids)
+		).group_by(LikeCounter.entity_id)
+		for entity_id, count, liked in db.execute(stmt):
+			result[entity_id] = LikesEngagement(entity_id=entity_id, count=count, liked=liked)
+		if settings.LIKES_WRITE_BEHIND:
+			likes_buffer.merge(result, entity_type=entity_type, user_id=user_id)
+		return result
 
 
+likes = CRUDLikes(Likes)
@@ -1,15 +1,22 @@
-from typing import Any, List
+from datetime import datetime
+from collections import defaultdict
+from typing import Any, List, Tuple, Iterable, Iterator
 
-from sqlalchemy.orm import Session
-from sqlalchemy import select, func, union, desc
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import select, func, desc, tuple_, true, literal, Subquery
 
 from fastapi import HTTPException, status
 
 from app.crud.base import CRUDBase
+from app.crud.crud_user import user
+from app.crud.crud_like import likes
 from app.models.post import Post
-from app.models.users import Users, following
+from app.models.image import Image
+from app.models.users import Users
 from app.schemas.post import PostDBCreate, PostUpdate
 from app.schemas.exceptions import ErrorResponse
+from app.core.config import settings
 
 
 class CRUDPost(CRUDBase[Post, PostDBCreate, PostUpdate]):
@@ -29,36 +36,146 @@ class CRUDPost(CRUDBase[Post, PostDBCreate, PostUpdate]):
 			)
 		return db_post
 
-	def get_page(self, db: Session, *, page: int, limit: int, id_: int) -> List[Post]:
-		"""Функция возвращает посты пользователя, разбитые на страницы"""
-		stmt = select(self.model).where(self.model.user_id == id_).offset((page - 1) * limit).limit(limit)
+	def get_page(self, db: Session, *, page: int, limit: int, id_: int, lookahead: bool = False) -> List[Post]:
+		"""Функция возвращает посты пользователя, разбитые на страницы.
+		lookahead=True - дополнительно вернуть первый пост следующей страницы, чтобы узнать есть ли она"""
+		stmt = select(self.model).where(self.model.user_id == id_).\
+			order_by(self.model.created_at.desc(), self.model.id.desc()).\
+			offset((page - 1) * limit).limit(limit + 1 if lookahead else limit)
 		return db.execute(stmt).scalars().all()
 
+	def create(self, db: Session, *, obj_in: PostDBCreate) -> Post:
+		"""Создаем пост и в той же транзакции увеличиваем posts_count автора"""
+		db_obj = self.model(**obj_in.model_dump())
+		db.add(db_obj)
+		user.change_counters(db, user_id=obj_in.user_id, posts_count=1)
+		db.commit()
+		db.refresh(db_obj)
+		return db_obj
+
+	def remove(self, db: Session, *, id_: int) -> Post:
+		"""Удаляем пост и в той же транзакции уменьшаем posts_count автора"""
+		db_obj = self.get(db, id_=id_)
+		db.delete(db_obj)
+		user.change_counters(db, user_id=db_obj.user_id, posts_count=-1)
+		db.commit()
+		return db_obj
+
 	def count_posts(self, db: Session, id_: int) -> int:
 		"""Функция считает общее количество постов пользователя"""
 		stmt = select(func.count("*")).select_from(self.model).where(self.model.user_id == id_)
 		return db.execute(stmt).scalar_one()
 
-	def get_all_feed(self, db: Session, *, page: int, limit: int, id_: int) -> List[Post]:
-		"""Функция возвращает посты основываясь на подписках пользователя, а также его собственные посты,
-		разбитые на страницы"""
-		_subquery = union(
-			select(following.c.follower_id.label("id")).where(following.c.followed_id == id_),
-			select(Users.id.label("id")).where(Users.id == id_)
-		).subquery()
-		stmt = select(self.model).join(_subquery, self.model.user_id == _subquery.c.id).\
-			order_by(Post.created_at.desc()).offset((page - 1) * limit).limit(limit)
+	def get_by_authors_cursor(
+			self,
+			db: Session,
+			*,
+			cursor: Tuple[datetime, int] | None,
+			limit: int,
+			authors: Subquery
+	) -> List[Post]:
+		"""Посты авторов из подзапроса authors (колонка id) старше курсора, limit + 1 штук. Для каждого автора
+		через LATERAL берем не больше limit + 1 постов по индексу ix_post_user_id_created_at_id, поэтому стоимость
+		запроса не зависит от того, насколько глубоко пользователь пролистал ленту"""
+		_lateral = select(self.model).where(self.model.user_id == authors.c.id)
+		if cursor:
+			_lateral = _lateral.where(tuple_(self.model.created_at, self.model.id) < tuple_(*cursor))
+		_lateral = _lateral.order_by(self.model.created_at.desc(), self.model.id.desc()).limit(limit + 1).lateral()
+		feed_post = aliased(self.model, _lateral)
+		stmt = select(feed_post).select_from(authors).join(_lateral, true()).\
+			order_by(feed_post.created_at.desc(), feed_post.id.desc()).limit(limit + 1)
 		return db.execute(stmt).scalars().all()
 
-	def count_feed_posts(self, db: Session, id_: int) -> int:
-		"""Функция считает количество постов в ленте, основываясь на подписках пользователя,
-		а также его собственные посты"""
-		_subquery = union(
-			select(following.c.follower_id.label("id")).where(following.c.followed_id == id_),
-			select(Users.id.label("id")).where(Users.id == id_)
-		).subquery()
-		stmt = select(func.count("*")).select_from(self.model).join(_subquery, self.model.user_id == _subquery.c.id)
-		return db.execute(stmt).scalar_one()
+	def hydrate(
+			self,
+			db: Session,
+			posts: Iterable[Post],
+			*,
+			max_depth: int | None = None,
+			root_original: bool = False,
+			liked_by: int | None = None
+	) -> List[Post]:
+		"""Подгружаем для страницы постов все что нужно PostDBOut: цепочки original_post, авторов и картинки.
+		Цепочки репостов всех постов страницы разворачиваются одним рекурсивным CTE не глубже max_depth
+		(по умолчанию POST_REPOST_MAX_DEPTH), дальше original_post обрезается. Авторы и картинки грузятся
+		по одному IN запросу. Загруженное проставляется через set_committed_value, поэтому при сериализации
+		запросов в бд больше не будет. root_original=True - original_post каждого поста страницы указывает
+		сразу на корень цепочки, без промежуточных репостов. liked_by - id пользователя, для которого постам
+		страницы заполняется engagement (количество лайков и отметка о его лайке) одним запросом"""
+		posts = list(posts)
+		if not posts:
+			return posts
+		max_depth = settings.POST_REPOST_MAX_DEPTH if max_depth is None else max_depth
+		loaded = {p.id: p for p in posts}
+		seeds = [p.original_post_id for p in posts if p.original_post_id]
+		if seeds and max_depth > 0:
+			_chain = select(self.model.id, self.model.original_post_id, literal(1).label("depth")).\
+				where(self.model.id.in_(seeds)).cte("chain", recursive=True)
+			_parent = aliased(self.model)
+			_chain = _chain.union_all(
+				select(_parent.id, _parent.original_post_id, _chain.c.depth + 1).
+				join(_chain, _parent.id == _chain.c.original_post_id).
+				where(_chain.c.depth < max_depth)
+			)
+			stmt = select(self.model).where(self.model.id.in_(select(_chain.c.id)))
+			loaded.update({p.id: p for p in db.execute(stmt).scalars().all()})
+
+		authors = db.execute(
+			select(Users).where(Users.id.in_(list({p.user_id for p in loaded.values()})))
+		).scalars().all()
+		authors = {a.id: a for a in authors}
+		images = defaultdict(list)
+		for db_image in db.execute(select(Image).where(Image.post_id.in_(list(loaded))).order_by(Image.id)).scalars():
+			images[db_image.post_id].append(db_image)
+
+		for db_post in loaded.values():
+			set_committed_value(db_post, "original_post", loaded.get(db_post.original_post_id))
+			set_committed_value(db_post, "author", authors.get(db_post.user_id))
+			set_committed_value(db_post, "images", images[db_post.id])
+		if root_original:
+			for db_post in posts:
+				root = db_post.original_post
+				while root is not None and root.original_post is not None:
+					root = root.original_post
+				set_committed_value(db_post, "original_post", root)
+		# engagement - обычный атрибут объекта, не колонка. Перезаписываем его всегда, чтобы в ответ
+		# не попали данные с прошлой гидрации того же объекта в сессии
+		engagement = {}
+		if liked_by is not None:
+			engagement = likes.get_engagement(
+				db, entity_type=self.model.__name__, entity_ids=[p.id for p in posts], user_id=liked_by
+			)
+		for db_post in posts:
+			db_post.engagement = engagement.get(db_post.id)
+		return posts
+
+	def stream_by_user(
+			self,
+			db: Session,
+			*,
+			user_id: int,
+			batch_size: int,
+			root_original: bool = False
+	) -> Iterator[List[Post]]:
+		"""Все посты пользователя пачками по batch_size через серверный курсор (yield_per).
+		Каждая пачка гидрируется через hydrate, а после того как вызывающий ее обработал, посты, их цепочки
+		и картинки убираются из сессии, поэтому память не растет с количеством постов"""
+		stmt = select(self.model).where(self.model.user_id == user_id).\
+			order_by(self.model.created_at.desc(), self.model.id.desc()).execution_options(yield_per=batch_size)
+		for partition in db.execute(stmt).scalars().partitions():
+			posts = self.hydrate(db, partition, root_original=root_original)
+			yield posts
+			loaded = {}
+			for db_post in posts:
+				while db_post is not None and db_post.id not in loaded:
+					loaded[db_post.id] = db_post
+					db_post = db_post.original_post
+			for db_post in loaded.values():
+				for db_image in db_post.images:
+					if db_image in db:
+						db.expunge(db_image)
+				if db_post in db:
+					db.expunge(db_post)
 
 
 post = CRUDPost(Post)
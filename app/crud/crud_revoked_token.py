@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+
+from app.crud.base import CRUDBase
+from app.models.revoked_token import RevokedToken
+from app.schemas.revoked_token import RevokedTokenCreate, RevokedTokenUpdate
+from app.schemas.token import TokenData
+from app.utils.revocation import revocations
+
+
+class CRUDRevokedToken(CRUDBase[RevokedToken, RevokedTokenCreate, RevokedTokenUpdate]):
+	def revoke(self, db: Session, *, token_data: TokenData) -> bool:
+		"""Отзываем токен одним INSERT ... ON CONFLICT DO NOTHING. Возвращает False, если токен уже был отозван:
+		так из двух одновременных ротаций одного refresh токена проходит только одна"""
+		stmt = insert(self.model).values(
+			jti=token_data.jti,
+			user_id=token_data.id,
+			expires_at=datetime.utcfromtimestamp(token_data.exp),
+			revoked_at=datetime.utcnow()
+		).on_conflict_do_nothing(index_elements=["jti"]).returning(self.model.jti)
+		revoked = db.execute(stmt).scalar_one_or_none() is not None
+		db.commit()
+		if revoked:
+			revocations.add(token_data.jti)
+		return revoked
+
+	def is_revoked(self, db: Session, *, jti: str) -> bool:
+		"""Проверка отзыва. Почти всегда отвечает Bloom фильтр в памяти, бд - только на возможное совпадение"""
+		return revocations.is_revoked(db, jti=jti)
+
+	def trim(self, db: Session) -> int:
+		"""Удаляем отзывы уже истекших токенов, такие токены отклоняются по exp"""
+		result = db.execute(delete(self.model).where(self.model.expires_at <= datetime.utcnow()))
+		db.commit()
+		return result.rowcount
+
+
+revoked_token = CRUDRevokedToken(RevokedToken)
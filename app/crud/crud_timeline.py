@@ -0,0 +1,128 @@
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, delete, exists, tuple_, literal, union_all
+from sqlalchemy.dialects.postgresql import insert
+
+from app.crud.base import CRUDBase
+from app.models.timeline import Timeline
+from app.models.post import Post
+from app.models.users import following
+from app.schemas.timeline import TimelineCreate, TimelineUpdate
+from app.core.config import settings
+
+
+class CRUDTimeline(CRUDBase[Timeline, TimelineCreate, TimelineUpdate]):
+	def fan_out(self, db: Session, *, post_obj: Post, include_followers: bool = True) -> int:
+		"""Раскладываем пост по лентам всех подписчиков автора и в ленту самого автора одним INSERT ... SELECT.
+		Подписчики автора лежат в following.followed_id у строк где following.follower_id == автор.
+		include_followers=False - пост попадет только в ленту автора (посты популярных авторов читаются при запросе)"""
+		_author = select(literal(post_obj.user_id).label("owner_id"))
+		if include_followers:
+			_owners = union_all(
+				select(following.c.followed_id.label("owner_id")).where(following.c.follower_id == post_obj.user_id),
+				_author
+			).subquery()
+		else:
+			_owners = _author.subquery()
+		_select = select(_owners.c.owner_id, literal(post_obj.id), literal(post_obj.created_at))
+		stmt = insert(self.model).from_select(["owner_id", "post_id", "created_at"], _select).\
+			on_conflict_do_nothing(index_elements=["owner_id", "post_id"])
+		result = db.execute(stmt)
+		db.commit()
+		return result.rowcount
+
+	def backfill(self, db: Session, *, owner_id: int, author_id: int) -> int:
+		"""После подписки докладываем в ленту owner_id последние посты author_id (не больше TIMELINE_MAX_LENGTH).
+		Задача могла выполниться уже после отписки и prune_author, поэтому посты вставляются, только если
+		подписка (строка following с follower_id == author_id и followed_id == owner_id) еще есть"""
+		_following = exists().where(following.c.follower_id == author_id, following.c.followed_id == owner_id)
+		_select = select(literal(owner_id), Post.id, Post.created_at).where(Post.user_id == author_id, _following).\
+			order_by(Post.created_at.desc(), Post.id.desc()).limit(settings.TIMELINE_MAX_LENGTH)
+		stmt = insert(self.model).from_select(["owner_id", "post_id", "created_at"], _select).\
+			on_conflict_do_nothing(index_elements=["owner_id", "post_id"])
+		result = db.execute(stmt)
+		self._trim(db, owner_ids=[owner_id])
+		db.commit()
+		return result.rowcount
+
+	def prune_author(self, db: Session, *, owner_id: int, author_id: int) -> int:
+		"""После отписки убираем из ленты owner_id все посты author_id"""
+		stmt = delete(self.model).where(
+			self.model.owner_id == owner_id,
+			self.model.post_id.in_(select(Post.id).where(Post.user_id == author_id))
+		)
+		result = db.execute(stmt)
+		db.commit()
+		return result.rowcount
+
+	def rebuild(self, db: Session, *, owner_id: int) -> int:
+		"""Собираем ленту owner_id заново из его постов и постов его подписок"""
+		db.execute(delete(self.model).where(self.model.owner_id == owner_id))
+		_authors = union_all(
+			select(following.c.follower_id.label("id")).where(following.c.followed_id == owner_id),
+			select(literal(owner_id).label("id"))
+		).subquery()
+		_select = select(literal(owner_id), Post.id, Post.created_at).join(_authors, Post.user_id == _authors.c.id).\
+			order_by(Post.created_at.desc(), Post.id.desc()).limit(settings.TIMELINE_MAX_LENGTH)
+		stmt = insert(self.model).from_select(["owner_id", "post_id", "created_at"], _select).\
+			on_conflict_do_nothing(index_elements=["owner_id", "post_id"])
+		result = db.execute(stmt)
+		db.commit()
+		return result.rowcount
+
+	def trim(self, db: Session) -> int:
+		"""Обрезаем до TIMELINE_MAX_LENGTH записей только те ленты, которые его превысили"""
+		_overflow = select(self.model.owner_id).group_by(self.model.owner_id).\
+			having(func.count("*") > settings.TIMELINE_MAX_LENGTH)
+		deleted = self._trim(db, owner_ids=_overflow)
+		db.commit()
+		return deleted
+
+	def _trim(self, db: Session, *, owner_ids) -> int:
+		"""Удаляем из лент owner_ids все записи старше TIMELINE_MAX_LENGTH-ой. Коммит на вызывающем."""
+		_ranked = select(
+			self.model.owner_id,
+			self.model.post_id,
+			func.row_number().over(
+				partition_by=self.model.owner_id,
+				order_by=(self.model.created_at.desc(), self.model.post_id.desc())
+			).label("rn")
+		).where(self.model.owner_id.in_(owner_ids)).subquery()
+		stmt = delete(self.model).where(
+			tuple_(self.model.owner_id, self.model.post_id).in_(
+				select(_ranked.c.owner_id, _ranked.c.post_id).where(_ranked.c.rn > settings.TIMELINE_MAX_LENGTH)
+			)
+		)
+		return db.execute(stmt).rowcount
+
+	def get_page(self, db: Session, *, page: int, limit: int, owner_id: int) -> List[Post]:
+		"""Лента owner_id, разбитая на страницы"""
+		stmt = select(Post).join(self.model, self.model.post_id == Post.id).where(self.model.owner_id == owner_id).\
+			order_by(self.model.created_at.desc(), self.model.post_id.desc()).offset((page - 1) * limit).limit(limit)
+		return db.execute(stmt).scalars().all()
+
+	def get_by_cursor(
+			self,
+			db: Session,
+			*,
+			cursor: Tuple[datetime, int] | None,
+			limit: int,
+			owner_id: int
+	) -> List[Post]:
+		"""Лента owner_id с keyset пагинацией по (created_at, post_id). Возвращает limit + 1 постов,
+		читается одним диапазоном индекса ix_timeline_owner_id_created_at_post_id"""
+		stmt = select(Post).join(self.model, self.model.post_id == Post.id).where(self.model.owner_id == owner_id)
+		if cursor:
+			stmt = stmt.where(tuple_(self.model.created_at, self.model.post_id) < tuple_(*cursor))
+		stmt = stmt.order_by(self.model.created_at.desc(), self.model.post_id.desc()).limit(limit + 1)
+		return db.execute(stmt).scalars().all()
+
+	def count(self, db: Session, owner_id: int) -> int:
+		"""Количество постов в ленте owner_id. Не больше TIMELINE_MAX_LENGTH после очередной обрезки"""
+		stmt = select(func.count("*")).select_from(self.model).where(self.model.owner_id == owner_id)
+		return db.execute(stmt).scalar_one()
+
+
+timeline = CRUDTimeline(Timeline)
@@ -1,16 +1,42 @@
-from typing import Any, Dict
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
 
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy.orm import Session, object_session, make_transient_to_detached
+from sqlalchemy import select, update, delete, func, or_, exists, literal, tuple_, event, Column, Row
+from sqlalchemy.dialects.postgresql import insert
 
 from fastapi import HTTPException, status
 
 from app.crud.base import CRUDBase
 from app.models.users import Users
 from app.models.users import following
+from app.models.post import Post
 from app.schemas.users import UserCreate, UserUpdate
 from app.schemas.exceptions import ErrorResponse
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hash, verify_password, password_needs_update
+from app.utils.follow_graph import follow_graph
+from app.utils.cache import TTLCache
+from app.core.config import settings
+
+# Колонки пользователей для get_current_user: user_id -> {колонка: значение}, живут PRINCIPAL_CACHE_TTL секунд
+principals = TTLCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL)
+
+
+def _drop_principals_after_commit(db: Session, ids: List[int]) -> None:
+	"""Счетчики меняются в транзакции вызывающего, поэтому записи кэша сбрасываются только после ее коммита.
+	Если сбросить раньше, параллельный запрос успеет снова закэшировать старую строку"""
+	db.info.setdefault("stale_principals", set()).update(ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_stale_principals(db: Session) -> None:
+	for id_ in db.info.pop("stale_principals", ()):
+		principals.pop(id_)
+
+
+@event.listens_for(Session, "after_rollback")
+def _keep_principals(db: Session) -> None:
+	db.info.pop("stale_principals", None)
 
 
 class CRUDUser(CRUDBase[Users, UserCreate, UserUpdate]):
@@ -30,6 +56,19 @@ class CRUDUser(CRUDBase[Users, UserCreate, UserUpdate]):
 			)
 		return db_user
 
+	def get_principal(self, db: Session, *, id_: int) -> Users:
+		"""Пользователь для авторизованного запроса. Колонки берутся из кэша процесса principals, объект
+		собирается из них и присоединяется к сессии через merge(load=False) без SELECT. Связи и истекшие после
+		коммита атрибуты загружаются как обычно. Кэш сбрасывается при изменении пользователя и его счетчиков"""
+		columns = principals.get(id_)
+		if columns is None:
+			db_user = self.get(db, id_=id_)
+			principals.set(id_, {attr.key: getattr(db_user, attr.key) for attr in self.model.__mapper__.column_attrs})
+			return db_user
+		db_user = self.model(**columns)
+		make_transient_to_detached(db_user)
+		return db.merge(db_user, load=False)
+
 	def get_by_email(self, db: Session, *, email: str) -> Users:
 		"""Возвращаем объекта класса Users из бд по имэйлу"""
 		stmt = select(self.model).filter_by(email=email)
@@ -61,7 +100,14 @@ class CRUDUser(CRUDBase[Users, UserCreate, UserUpdate]):
 			hashed_password = get_password_hash(update_data['password'])
 			del update_data['password']
 			update_data['hashed_password'] = hashed_password
-		return super().update(db, db_obj=db_obj, obj_in=update_data)
+		db_obj = super().update(db, db_obj=db_obj, obj_in=update_data)
+		principals.pop(db_obj.id)
+		return db_obj
+
+	def remove(self, db: Session, *, id_: int) -> Users:
+		db_obj = super().remove(db, id_=id_)
+		principals.pop(id_)
+		return db_obj
 
 	def authenticate(self, db: Session, *, email: str, password: str) -> Users | None:
 		"""Проверяем существует ли юзер и сравниваем предоставленный им пароль с хэшем в бд"""
@@ -70,40 +116,176 @@ class CRUDUser(CRUDBase[Users, UserCreate, UserUpdate]):
 			return None
 		if not verify_password(password=password, hashed_password=auth_user.hashed_password):
 			return None
+		if password_needs_update(auth_user.hashed_password):
+			# пароль известен только сейчас, поэтому хэш с новыми параметрами (BCRYPT_ROUNDS) пишем при входе
+			auth_user.hashed_password = get_password_hash(password)
+			db.commit()
+			principals.pop(auth_user.id)
 		return auth_user
 
 	@staticmethod
 	def is_following(*, user_db: Users, user_to_follow: Users) -> bool:
-		"""Здесь получаем список подписок user_db - (select * from following where followed_id = user_db)
-		вернет все значения из follower_id которые подходят по условию. Далее проверяю если в колонке
-		follower_id есть значение которое равно user_to_follow.id, то счетчик count будет больше 0 и вернет True"""
-		return user_db.followed.filter(following.c.follower_id == user_to_follow.id).count() > 0
+		"""Подписан ли user_db на user_to_follow. Подписка user_db лежит в строке following с
+		follower_id == user_to_follow и followed_id == user_db, проверяется одним поиском по первичному ключу"""
+		stmt = select(exists().where(
+			following.c.follower_id == user_to_follow.id, following.c.followed_id == user_db.id
+		))
+		return object_session(user_db).execute(stmt).scalar()
 
 	@classmethod
 	def follow(cls, db: Session, *, user_db: Users, user_to_follow: Users) -> Users | None:
-		"""user_db подписывается на user_to_follow. Точнее user_db.followed вернет список из пользователей,
-		на которых подписан user_db (select * from following where followed_id = user_db) вернет все значения
-		из follower_id которые подходят по условию. Команда user_db.followed.append(user_to_follow) добавит
-		пользователя follower в этот список"""
-		if not cls.is_following(user_db=user_db, user_to_follow=user_to_follow):
-			user_db.followed.append(user_to_follow)
-			db.commit()
-			return user_db
-		else:
-			return user_db
+		"""user_db подписывается на user_to_follow. Повторная подписка ничего не меняет (см. follow_many)"""
+		cls.follow_many(db, user_db=user_db, user_ids=[user_to_follow.id])
+		return user_db
 
 	@classmethod
 	def unfollow(cls, db: Session, *, user_db: Users, user_to_follow: Users) -> Users | None:
-		"""user_db отписывается от user_to_follow. user_db.followed вернет список из пользователей,
-		на которых подписан user_db (select * from following where followed_id = user_db) вернет все значения
-		из follower_id которые подходят по условию. Команда user_db.followed.remove(user_to_follow) удалит
-		follower из этого списка."""
-		if cls.is_following(user_db=user_db, user_to_follow=user_to_follow):
-			user_db.followed.remove(user_to_follow)
-			db.commit()
-			return user_db
-		else:
-			return user_db
+		"""user_db отписывается от user_to_follow. Отписка без подписки ничего не меняет (см. unfollow_many)"""
+		cls.unfollow_many(db, user_db=user_db, user_ids=[user_to_follow.id])
+		return user_db
+
+	@classmethod
+	def follow_many(cls, db: Session, *, user_db: Users, user_ids: List[int]) -> List[int]:
+		"""user_db подписывается на всех user_ids одним INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+		Несуществующие id и сам user_db пропускаются. Возвращает id пользователей, подписка на которых
+		действительно добавилась, счетчики сдвигаются только на них"""
+		_select = select(Users.id, literal(user_db.id), literal(datetime.utcnow())).\
+			where(Users.id.in_(user_ids), Users.id != user_db.id)
+		stmt = insert(following).from_select(["follower_id", "followed_id", "created_at"], _select).\
+			on_conflict_do_nothing().returning(following.c.follower_id)
+		followed = db.execute(stmt).scalars().all()
+		cls._shift_follow_counters(db, user_id=user_db.id, user_ids=followed, delta=1)
+		db.commit()
+		follow_graph.record(user_id=user_db.id, user_ids=followed, followed=True)
+		return followed
+
+	@classmethod
+	def unfollow_many(cls, db: Session, *, user_db: Users, user_ids: List[int]) -> List[int]:
+		"""user_db отписывается от всех user_ids одним DELETE ... RETURNING. Возвращает id пользователей,
+		подписка на которых действительно была удалена"""
+		stmt = delete(following).where(following.c.follower_id.in_(user_ids), following.c.followed_id == user_db.id).\
+			returning(following.c.follower_id)
+		unfollowed = db.execute(stmt).scalars().all()
+		cls._shift_follow_counters(db, user_id=user_db.id, user_ids=unfollowed, delta=-1)
+		db.commit()
+		follow_graph.record(user_id=user_db.id, user_ids=unfollowed, followed=False)
+		return unfollowed
+
+	def get_followers_by_cursor(
+			self,
+			db: Session,
+			*,
+			user_id: int,
+			cursor: Tuple[datetime, int] | None,
+			limit: int
+	) -> List[Row]:
+		"""Подписчики user_id от новых к старым (строки following с follower_id == user_id).
+		Возвращает limit + 1 строк (id, name, surname, created_at), created_at - время подписки"""
+		return self._follow_list(
+			db, owner=following.c.follower_id, other=following.c.followed_id,
+			user_id=user_id, cursor=cursor, limit=limit
+		)
+
+	def get_following_by_cursor(
+			self,
+			db: Session,
+			*,
+			user_id: int,
+			cursor: Tuple[datetime, int] | None,
+			limit: int
+	) -> List[Row]:
+		"""Подписки user_id от новых к старым (строки following с followed_id == user_id).
+		Возвращает то же, что и get_followers_by_cursor"""
+		return self._follow_list(
+			db, owner=following.c.followed_id, other=following.c.follower_id,
+			user_id=user_id, cursor=cursor, limit=limit
+		)
+
+	def _follow_list(
+			self,
+			db: Session,
+			*,
+			owner: Column,
+			other: Column,
+			user_id: int,
+			cursor: Tuple[datetime, int] | None,
+			limit: int
+	) -> List[Row]:
+		"""Keyset пагинация по (created_at, other) диапазоном индекса (owner, created_at, other).
+		Из users берутся только колонки карточки, без загрузки объектов"""
+		stmt = select(self.model.id, self.model.name, self.model.surname, following.c.created_at).\
+			join(following, self.model.id == other).where(owner == user_id)
+		if cursor:
+			stmt = stmt.where(tuple_(following.c.created_at, other) < tuple_(*cursor))
+		stmt = stmt.order_by(following.c.created_at.desc(), other.desc()).limit(limit + 1)
+		return db.execute(stmt).all()
+
+	@staticmethod
+	def get_relationships(db: Session, *, user_id: int, user_ids: List[int]) -> Dict[int, Tuple[bool, bool]]:
+		"""Отношения user_id с каждым из user_ids одним запросом: {id: (user_id подписан на id, id подписан
+		на user_id)}. Подписка user_id на X - строка (follower_id=X, followed_id=user_id), подписка X на user_id -
+		строка (follower_id=user_id, followed_id=X). Обе половины условия читаются по индексам с user_id в начале"""
+		relationships = {id_: (False, False) for id_ in user_ids}
+		if not user_ids:
+			return relationships
+		stmt = select(following.c.follower_id, following.c.followed_id).where(or_(
+			(following.c.followed_id == user_id) & following.c.follower_id.in_(user_ids),
+			(following.c.follower_id == user_id) & following.c.followed_id.in_(user_ids)
+		))
+		for follower_id, followed_id in db.execute(stmt):
+			if followed_id == user_id:
+				relationships[follower_id] = (True, relationships[follower_id][1])
+			if follower_id == user_id:
+				relationships[followed_id] = (relationships[followed_id][0], True)
+		return relationships
+
+	def get_cards(self, db: Session, *, ids: List[int]) -> Dict[int, Row]:
+		"""Колонки карточек (id, name, surname) пользователей ids одним запросом"""
+		if not ids:
+			return {}
+		stmt = select(self.model.id, self.model.name, self.model.surname).where(self.model.id.in_(ids))
+		return {row.id: row for row in db.execute(stmt)}
+
+	@classmethod
+	def _shift_follow_counters(cls, db: Session, *, user_id: int, user_ids: List[int], delta: int) -> None:
+		"""following_count подписчика и followers_count всех user_ids сдвигаются на delta. Коммит на вызывающем"""
+		if not user_ids:
+			return
+		cls.change_counters(db, user_id=user_id, following_count=delta * len(user_ids))
+		db.execute(
+			update(Users).where(Users.id.in_(user_ids)).values(followers_count=Users.followers_count + delta).
+			execution_options(synchronize_session=False)
+		)
+		_drop_principals_after_commit(db, user_ids)
+
+	@staticmethod
+	def change_counters(db: Session, *, user_id: int, **deltas: int) -> None:
+		"""Сдвигаем счетчики posts_count, followers_count, following_count пользователя на deltas одним UPDATE
+		(users.x = users.x + delta, без гонок между запросами). Коммит на вызывающем, чтобы счетчик менялся
+		в одной транзакции с постом или подпиской"""
+		values = {name: getattr(Users, name) + delta for name, delta in deltas.items()}
+		db.execute(update(Users).where(Users.id == user_id).values(**values))
+		_drop_principals_after_commit(db, [user_id])
+
+	def reconcile_counters(self, db: Session) -> int:
+		"""Пересчитываем счетчики по таблицам post и following и исправляем только разошедшиеся строки.
+		Подписчики X - строки following с follower_id == X, подписки Y - строки с followed_id == Y"""
+		_posts = select(func.count("*")).select_from(Post).where(Post.user_id == self.model.id).scalar_subquery()
+		_followers = select(func.count("*")).select_from(following).\
+			where(following.c.follower_id == self.model.id).scalar_subquery()
+		_following = select(func.count("*")).select_from(following).\
+			where(following.c.followed_id == self.model.id).scalar_subquery()
+		stmt = update(self.model).where(or_(
+			self.model.posts_count != _posts,
+			self.model.followers_count != _followers,
+			self.model.following_count != _following
+		)).values(posts_count=_posts, followers_count=_followers, following_count=_following).\
+			execution_options(synchronize_session=False)
+		result = db.execute(stmt)
+		db.commit()
+		if result.rowcount:
+			principals.clear()
+		return result.rowcount
 
 
 user = CRUDUser(Users)
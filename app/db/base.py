@@ -4,3 +4,7 @@ from app.models.image import Image
 from app.models.post import Post
 from app.models.comment import Comment
 from app.models.likes import Likes
+from app.models.timeline import Timeline
+from app.models.like_counter import LikeCounter
+from app.models.leaderboard import Leaderboard
+from app.models.revoked_token import RevokedToken
@@ -6,6 +6,8 @@ from fastapi.staticfiles import StaticFiles
 
 from app.api.api_v1.api import api_router
 from app.core.config import settings
+from app.utils.likes_flush import likes_flusher
+from app.utils.follow_graph import follow_graph
 
 app = FastAPI(title="Breads")
 
@@ -16,6 +18,24 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 app.mount("/static", StaticFiles(directory=static_path), name="static")
 
 
+@app.on_event("startup")
+def start_likes_flusher() -> None:
+	"""Журнал write-behind лайков лежит на локальном диске, поэтому его пишет в бд сам процесс сервера"""
+	if settings.LIKES_WRITE_BEHIND:
+		likes_flusher.start()
+
+
+@app.on_event("startup")
+def start_follow_graph() -> None:
+	"""Снимок графа подписок для подсказок собирается в фоне, чтобы его не собирал первый запрос"""
+	follow_graph.start()
+
+
+@app.on_event("shutdown")
+def stop_likes_flusher() -> None:
+	likes_flusher.stop()
+
+
 @app.get("/health", include_in_schema=True, status_code=status.HTTP_200_OK)
 async def health() -> JSONResponse:
 	return JSONResponse({"message": "It worked!!"})
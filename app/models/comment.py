@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import TYPE_CHECKING, List
 
-from sqlalchemy import Text, DateTime, ForeignKey, String, Integer
+from sqlalchemy import Text, DateTime, ForeignKey, String, Integer, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy_utils import generic_relationship
 
@@ -21,6 +21,10 @@ class Comment(Base):
 	parent_comment_id: Mapped[int | None] = mapped_column(ForeignKey("comment.id"))
 	commentable_type: Mapped[str] = mapped_column(String(50))
 	commentable_id: Mapped[int] = mapped_column(Integer)
+	# Материализованный путь от корня ветки: id предков и свой id через точку, с точкой в конце ("12.45.78.").
+	# Поддерево комментария - все строки, у которых path начинается с его path. depth - глубина, у корня 0
+	path: Mapped[str | None] = mapped_column(Text)
+	depth: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 	author: Mapped["Users"] = relationship(back_populates="comments")
 	parent_comment: Mapped["Comment"] = relationship(back_populates="child_comments", remote_side=[id])
 	child_comments: Mapped[List["Comment"]] = relationship(back_populates="parent_comment", lazy="selectin")
@@ -30,3 +34,16 @@ class Comment(Base):
 
 	def __repr__(self) -> str:
 		return f"id:{self.id}, type: {self.commentable_type}, commentable_id: {self.commentable_id}"
+
+
+Index("ix_comment_path", Comment.path, postgresql_ops={"path": "text_pattern_ops"})
+# Комментарии сущности верхнего уровня (parent_comment_id IS NULL) читаются keyset пагинацией по (created_at, id),
+# ответы считаются по тем же первым колонкам
+Index(
+	"ix_comment_commentable_parent_comment_id_created_at_id",
+	Comment.commentable_type,
+	Comment.commentable_id,
+	Comment.parent_comment_id,
+	Comment.created_at,
+	Comment.id
+)
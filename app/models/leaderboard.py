@@ -0,0 +1,31 @@
+from datetime import date
+
+from sqlalchemy import String, Integer, Date, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base_class import Base
+
+
+class Leaderboard(Base):
+	"""Счет сущности в окне period (day, week), bucket - первый день окна. Счет - число лайков, полученных
+	в окне, его периодически пересчитывает refresh_leaderboard, поэтому топ читается по индексу без обращения к likes"""
+	__tablename__ = "leaderboard"
+
+	period: Mapped[str] = mapped_column(String(10), primary_key=True)
+	bucket: Mapped[date] = mapped_column(Date, primary_key=True)
+	entity_type: Mapped[str] = mapped_column(String(50), primary_key=True)
+	entity_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	score: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+	def __repr__(self) -> str:
+		return f"{self.period} {self.bucket} - type: {self.entity_type} - id: {self.entity_id} - score: {self.score}"
+
+
+Index(
+	"ix_leaderboard_period_bucket_entity_type_score_entity_id",
+	Leaderboard.period,
+	Leaderboard.bucket,
+	Leaderboard.entity_type,
+	Leaderboard.score.desc(),
+	Leaderboard.entity_id.desc()
+)
@@ -0,0 +1,18 @@
+from sqlalchemy import String, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base_class import Base
+
+
+class LikeCounter(Base):
+	"""Счетчик лайков сущности, разбитый на LIKE_COUNTER_SHARDS строк. Каждый лайк меняет случайный shard,
+	поэтому одновременные лайки одного поста не ждут блокировку одной строки. Количество - сумма по shard"""
+	__tablename__ = "like_counter"
+
+	entity_type: Mapped[str] = mapped_column(String(50), primary_key=True)
+	entity_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+	count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+	def __repr__(self) -> str:
+		return f"type: {self.entity_type} - id: {self.entity_id} - shard: {self.shard} - count: {self.count}"
@@ -1,4 +1,6 @@
-from sqlalchemy import ForeignKey, String, Integer
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, String, Integer, Index, DateTime
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy_utils import generic_relationship
 
@@ -12,8 +14,15 @@ class Likes(Base):
 	user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
 	entity_type: Mapped[str] = mapped_column(String(50))
 	entity_id: Mapped[int] = mapped_column(Integer)
+	created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 	# https://sqlalchemy-utils.readthedocs.io/en/latest/generic_relationship.html
 	entity = generic_relationship(entity_type, entity_id)
 
 	def __repr__(self) -> str:
 		return f"id: {self.id} - user: {self.user_id} - type: {self.entity_type}"
+
+
+# Один лайк пользователя на сущность, на этот индекс опирается INSERT ... ON CONFLICT в CRUDLikes.create
+Index("ix_likes_entity_type_entity_id_user_id", Likes.entity_type, Likes.entity_id, Likes.user_id, unique=True)
+# Окна топа лайков пересчитываются диапазоном по created_at без чтения самих строк (см. CRUDLeaderboard.rebuild)
+Index("ix_likes_created_at_entity_type_entity_id", Likes.created_at, Likes.entity_type, Likes.entity_id)
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import List, TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, Text, DateTime
+from sqlalchemy import ForeignKey, Text, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base_class import Base
@@ -22,8 +22,12 @@ class Post(Base):
 	original_post_id: Mapped[int | None] = mapped_column(ForeignKey("post.id"))
 	author: Mapped["Users"] = relationship(back_populates="posts")
 	original_post: Mapped["Post"] = relationship(remote_side=[id])
-	images: Mapped[List["Image"]] = relationship(back_populates="post", lazy="dynamic", cascade="all, delete-orphan")
+	# обычная коллекция (не dynamic), чтобы картинки можно было подгружать пачкой для страницы постов
+	images: Mapped[List["Image"]] = relationship(back_populates="post", cascade="all, delete-orphan")
 
 	def __repr__(self) -> str:
 		return f"id: {self.id}, created: {self.created_at}, user_id: {self.user_id}"
 
+
+# Лента и посты пользователя читаются по (created_at, id) в обратном порядке, индекс покрывает keyset пагинацию
+Index("ix_post_user_id_created_at_id", Post.user_id, Post.created_at.desc(), Post.id.desc())
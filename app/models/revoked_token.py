@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from sqlalchemy import String, Integer, DateTime, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base_class import Base
+
+
+class RevokedToken(Base):
+	"""Отозванный токен (refresh после ротации или выхода, access при выходе). Строка нужна только пока токен
+	не истек, после expires_at ее удаляет trim_revoked_tokens. По revoked_at процессы дочитывают новые отзывы"""
+	__tablename__ = "revoked_token"
+
+	jti: Mapped[str] = mapped_column(String(32), primary_key=True)
+	user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+	expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+	revoked_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+	def __repr__(self) -> str:
+		return f"jti: {self.jti} - user: {self.user_id} - expires: {self.expires_at}"
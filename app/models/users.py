@@ -1,7 +1,7 @@
-from datetime import date
+from datetime import date, datetime
 from typing import List, TYPE_CHECKING
 
-from sqlalchemy import Column, Table, Integer, String, ForeignKey, Text
+from sqlalchemy import Column, Table, Integer, String, ForeignKey, Text, Index, DateTime
 from sqlalchemy.orm import relationship, backref, mapped_column, Mapped
 
 from app.db.base_class import Base
@@ -12,10 +12,15 @@ from app.models.likes import Likes
 
 
 # follower_id - следящий, followed_id - следуемый
+# Первичный ключ обслуживает проверку и изменение подписки, индексы по created_at - списки подписчиков X
+# (follower_id == X) и подписок Y (followed_id == Y) от новых к старым
 following = Table(
 	'following', Base.metadata,
-	Column('follower_id', Integer, ForeignKey('users.id')),
-	Column('followed_id', Integer, ForeignKey('users.id'))
+	Column('follower_id', Integer, ForeignKey('users.id'), primary_key=True),
+	Column('followed_id', Integer, ForeignKey('users.id'), primary_key=True),
+	Column('created_at', DateTime, default=datetime.utcnow, nullable=False),
+	Index('ix_following_follower_id_created_at_followed_id', 'follower_id', 'created_at', 'followed_id'),
+	Index('ix_following_followed_id_created_at_follower_id', 'followed_id', 'created_at', 'follower_id')
 )
 
 
@@ -29,6 +34,10 @@ class Users(Base):
 	birth_date: Mapped[date | None]
 	about_me: Mapped[str | None] = mapped_column(Text)
 	hashed_password: Mapped[str | None] = mapped_column(String(200))
+	# Денормализованные счетчики, меняются в той же транзакции что и посты/подписки (см. CRUDUser.change_counters)
+	posts_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+	followers_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+	following_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
 	# В документации sqlalchemy увидел что предпочтительнее использовать back_populates
 	# Надо подумать, возможно редактировать определение связи
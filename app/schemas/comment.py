@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 
 from pydantic import BaseModel, ConfigDict
@@ -44,6 +44,19 @@ class CommentDBOutWithComments(CommentDBOut):
 CommentDBOutWithComments.model_rebuild()
 
 
-class CommentsDBOut(BaseModel):
-	comments: List[CommentDBOutWithComments] | None = []
+class CommentDBOutWithReplies(CommentDBOut):
+	replies_count: int = 0
 
+
+class CommentFlatOut(CommentDBCreate):
+	"""Комментарий без вложенных автора и родителя, они связываются по user_id и parent_comment_id"""
+	id: int
+	commentable_type: str
+	commentable_id: int
+	depth: int = 0
+
+
+class CommentsNormalizedOut(BaseModel):
+	"""Ветка комментариев плоским списком, авторы без повторов в users по id"""
+	comments: List[CommentFlatOut]
+	users: Dict[int, UserOut]
@@ -0,0 +1,28 @@
+from datetime import date
+from enum import Enum
+
+from pydantic import BaseModel
+
+from app.schemas.post import PostDBOut
+
+
+class LeaderboardPeriod(str, Enum):
+	day = "day"
+	week = "week"
+
+
+class LeaderboardCreate(BaseModel):
+	period: LeaderboardPeriod
+	bucket: date
+	entity_type: str
+	entity_id: int
+	score: int = 0
+
+
+class LeaderboardUpdate(BaseModel):
+	score: int
+
+
+class TopPost(BaseModel):
+	score: int
+	post: PostDBOut
@@ -14,7 +14,14 @@ class LikesCount(BaseModel):
 
 
 class LikeDBOut(BaseModel):
-	id: int
+	# None, если лайк еще в write-behind буфере
+	id: int | None = None
 	user_id: int
 	entity_type: str
 	entity_id: int
+
+
+class LikesEngagement(BaseModel):
+	entity_id: int
+	count: int
+	liked: bool
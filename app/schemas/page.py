@@ -1,12 +1,23 @@
+from enum import Enum
 from pydantic import BaseModel
 from typing import List, TypeVar, Generic
 
 T = TypeVar("T")
 
 
+class TotalMode(str, Enum):
+	"""exact - total считается на каждый запрос, cached - total из кэша (обновляется в фоне),
+	none - total не считается, только has_more"""
+	exact = "exact"
+	cached = "cached"
+	none = "none"
+
+
 class Page(BaseModel, Generic[T]):
 	items: List[T]
-	total: int
-	page: int
+	total: int | None = None
+	page: int | None = None
 	size: int
-	pages: int
+	pages: int | None = None
+	has_more: bool | None = None
+	next_cursor: str | None = None
@@ -5,6 +5,7 @@ from pydantic import BaseModel, ConfigDict, model_validator
 
 from app.schemas.users import UserOut
 from app.schemas.image import ImageDBOut
+from app.schemas.like import LikesEngagement
 
 
 class PostCreate(BaseModel):
@@ -58,6 +59,7 @@ class PostDBOut(PostDBCreate):
 	author: UserOut | None = None
 	original_post: Optional["PostDBOut"] = None
 	images: List[ImageDBOut] | None = None
+	engagement: LikesEngagement | None = None
 
 
 class PostsDBOut(BaseModel):
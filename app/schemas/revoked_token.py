@@ -0,0 +1,13 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class RevokedTokenCreate(BaseModel):
+	jti: str
+	user_id: int
+	expires_at: datetime
+
+
+class RevokedTokenUpdate(BaseModel):
+	expires_at: datetime
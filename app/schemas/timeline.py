@@ -0,0 +1,13 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class TimelineCreate(BaseModel):
+	owner_id: int
+	post_id: int
+	created_at: datetime
+
+
+class TimelineUpdate(TimelineCreate):
+	pass
@@ -8,3 +8,6 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
 	id: int | None = None
+	jti: str | None = None
+	type: str | None = None
+	exp: int | None = None
@@ -1,5 +1,5 @@
 from typing import List, Sequence
-from datetime import date
+from datetime import date, datetime
 
 from pydantic import BaseModel, EmailStr, ConfigDict
 
@@ -28,7 +28,35 @@ class UserInDBBase(UserBase):
 
 
 class UserOut(UserInDBBase):
-	pass
+	posts_count: int = 0
+	followers_count: int = 0
+	following_count: int = 0
+
+
+class UserCard(BaseModel):
+	"""Карточка пользователя в списках подписчиков и подписок, created_at - время подписки"""
+	model_config = ConfigDict(from_attributes=True)
+
+	id: int
+	name: str | None = None
+	surname: str | None = None
+	created_at: datetime
+
+
+class UserSuggestion(BaseModel):
+	"""Подсказка "на кого подписаться", mutual - сколько подписок пользователя подписаны на него"""
+	id: int
+	name: str | None = None
+	surname: str | None = None
+	mutual: int
+
+
+class Relationship(BaseModel):
+	"""following - текущий пользователь подписан на user_id, followed_by - user_id подписан на текущего"""
+	user_id: int
+	following: bool
+	followed_by: bool
+	mutual: bool
 
 
 class UserInDB(UserInDBBase):
@@ -41,3 +69,13 @@ class UserOutWithFollowers(UserOut):
 
 class UserOutWithFollowed(UserOut):
 	followed: List[UserOut] | None = None
+
+
+class FollowBatch(BaseModel):
+	follow: List[int] = []
+	unfollow: List[int] = []
+
+
+class FollowBatchOut(BaseModel):
+	followed: List[int] = []
+	unfollowed: List[int] = []
@@ -0,0 +1,43 @@
+import timeit
+import logging
+
+from app.core.security import create_access_token, verify_token, verified_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def bench(*, number: int = 10000, users: int = 100) -> dict:
+	"""Среднее время verify_token на вызов в микросекундах: с полной проверкой jwt (кэш очищается перед каждым
+	вызовом) и с прогретым кэшем проверенных токенов. users - сколько разных токенов перебирается по кругу"""
+	tokens = [create_access_token(user_id) for user_id in range(1, users + 1)]
+
+	def cold() -> None:
+		for token in tokens:
+			verified_tokens.clear()
+			verify_token(token)
+
+	def warm() -> None:
+		for token in tokens:
+			verify_token(token)
+
+	rounds = max(number // users, 1)
+	cold_us = timeit.timeit(cold, number=rounds) / (rounds * users) * 1e6
+	warm()
+	hits, misses = verified_tokens.hits, verified_tokens.misses
+	warm_us = timeit.timeit(warm, number=rounds) / (rounds * users) * 1e6
+	return {
+		"decode_us": round(cold_us, 2),
+		"cached_us": round(warm_us, 2),
+		"speedup": round(cold_us / warm_us, 1),
+		"hits": verified_tokens.hits - hits,
+		"misses": verified_tokens.misses - misses
+	}
+
+
+def main() -> None:
+	logging.basicConfig(level=logging.INFO)
+	logger.info(f"verify_token per call: {bench()}")
+
+
+if __name__ == '__main__':
+	main()
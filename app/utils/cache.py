@@ -0,0 +1,51 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+	"""Потокобезопасный LRU кэш процесса с временем жизни записей. Когда записей больше maxsize,
+	вытесняется та, к которой дольше всего не обращались. Истекшие записи удаляются при чтении."""
+
+	def __init__(self, *, maxsize: int, ttl: float) -> None:
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.hits = 0
+		self.misses = 0
+		self._data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key: Hashable, default: Any = None) -> Any:
+		"""Возвращает значение по ключу или default, если записи нет или она истекла"""
+		with self._lock:
+			entry = self._data.get(key)
+			if entry is None or entry[1] <= time.monotonic():
+				if entry is not None:
+					del self._data[key]
+				self.misses += 1
+				return default
+			self._data.move_to_end(key)
+			self.hits += 1
+			return entry[0]
+
+	def set(self, key: Hashable, value: Any, *, ttl: float | None = None) -> None:
+		"""Сохраняет значение. ttl - время жизни записи в секундах, по умолчанию ttl кэша"""
+		expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+		with self._lock:
+			self._data[key] = (value, expires_at)
+			self._data.move_to_end(key)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+
+	def pop(self, key: Hashable) -> None:
+		"""Удаляет запись, если она есть"""
+		with self._lock:
+			self._data.pop(key, None)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._data.clear()
+
+	def __len__(self) -> int:
+		return len(self._data)
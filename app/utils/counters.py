@@ -0,0 +1,19 @@
+from celery.utils.log import get_task_logger
+
+from app.core.celery_app import celery
+from app.db.session import SessionLocal
+from app.crud.crud_user import user
+
+logger = get_task_logger(__name__)
+
+
+@celery.task
+def reconcile_counters() -> None:
+	"""Периодически сверяем денормализованные счетчики пользователей с таблицами post и following"""
+	db = SessionLocal()
+	try:
+		fixed = user.reconcile_counters(db)
+		if fixed:
+			logger.warning(f"Fixed counters of {fixed} users")
+	finally:
+		db.close()
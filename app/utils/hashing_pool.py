@@ -0,0 +1,105 @@
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException, status
+
+from app.schemas.exceptions import ErrorResponse
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HashingPool:
+	"""Отдельный пул процессов для bcrypt. Хэш считается около 0.25 с процессорного времени (BCRYPT_ROUNDS=12),
+	поэтому волна логинов и регистраций в общем пуле потоков AnyIO занимает все ядра процесса сервера и все его
+	потоки. Здесь хэширование занимает не больше processes ядер, а поток запроса только ждет результат.
+
+	Ожидающий поток все равно занимает место в пуле потоков AnyIO (40 по умолчанию), поэтому одновременно
+	в пуле (в очереди и в работе) не больше max_pending задач, и это число должно быть заметно меньше размера
+	пула потоков. Запрос сверх max_pending не ждет, а сразу получает 503, так что остальным эндпоинтам всегда
+	остается не меньше 40 - max_pending потоков. processes=0 - считать в вызывающем потоке (celery, тесты).
+	Пул создается при первом обращении в режиме spawn, чтобы не форкать процесс с запущенными потоками.
+	Метрики очереди (stats) пишутся в лог не чаще раза в stats_interval секунд, пока через пул идут задачи."""
+
+	def __init__(self, *, processes: int, max_pending: int, stats_interval: float) -> None:
+		self.processes = processes
+		self.stats_interval = stats_interval
+		self._logged_at = time.monotonic()
+		self._slots = threading.BoundedSemaphore(max_pending)
+		self._executor: ProcessPoolExecutor | None = None
+		self._lock = threading.Lock()
+		self.submitted = 0
+		self.rejected = 0
+		self.pending = 0
+		self.peak_pending = 0
+		self.wait_seconds = 0.0
+
+	def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+		"""Выполняет fn(*args) в пуле и ждет результат. fn должна быть функцией уровня модуля"""
+		if not self.processes:
+			return fn(*args)
+		started_at = time.monotonic()
+		if not self._slots.acquire(blocking=False):
+			with self._lock:
+				self.rejected += 1
+			logger.warning(f"Hashing pool is full, {self.pending} tasks pending")
+			error_response = ErrorResponse(
+				loc="password",
+				msg="Too many concurrent password checks, try again later",
+				type="service_unavailable"
+			)
+			raise HTTPException(
+				status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+				detail=[error_response.model_dump()]
+			)
+		with self._lock:
+			self.submitted += 1
+			self.pending += 1
+			self.peak_pending = max(self.peak_pending, self.pending)
+		try:
+			return self._get_executor().submit(fn, *args).result()
+		finally:
+			with self._lock:
+				self.pending -= 1
+				self.wait_seconds += time.monotonic() - started_at
+			self._slots.release()
+			self._log_stats()
+
+	def stats(self) -> Dict[str, Any]:
+		"""Метрики очереди: сколько задач принято и отклонено, сколько ждут сейчас и максимум,
+		среднее время от постановки в очередь до результата"""
+		with self._lock:
+			return {
+				"submitted": self.submitted,
+				"rejected": self.rejected,
+				"pending": self.pending,
+				"peak_pending": self.peak_pending,
+				"avg_wait_seconds": self.wait_seconds / self.submitted if self.submitted else 0.0
+			}
+
+	def _log_stats(self) -> None:
+		now = time.monotonic()
+		with self._lock:
+			if now - self._logged_at < self.stats_interval:
+				return
+			self._logged_at = now
+		logger.info(f"Hashing pool stats: {self.stats()}")
+
+	def _get_executor(self) -> ProcessPoolExecutor:
+		with self._lock:
+			if self._executor is None:
+				self._executor = ProcessPoolExecutor(
+					max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+				)
+			return self._executor
+
+
+hashing_pool = HashingPool(
+	processes=settings.BCRYPT_PROCESSES,
+	max_pending=settings.BCRYPT_MAX_PENDING,
+	stats_interval=settings.BCRYPT_STATS_LOG_INTERVAL
+)
@@ -0,0 +1,61 @@
+import logging
+from datetime import datetime, timedelta
+
+from celery.utils.log import get_task_logger
+
+from app.core.celery_app import celery
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.crud.crud_leaderboard import leaderboard
+from app.schemas.leaderboard import LeaderboardPeriod
+
+logger = get_task_logger(__name__)
+
+
+@celery.task
+def refresh_leaderboard() -> None:
+	"""Периодически пересчитываем текущие окна топа лайков"""
+	db = SessionLocal()
+	try:
+		inserted = leaderboard.refresh(db)
+		logger.info(f"Refreshed leaderboard, {inserted} rows")
+	finally:
+		db.close()
+
+
+@celery.task
+def trim_leaderboard() -> None:
+	"""Периодически удаляем старые окна топа лайков"""
+	db = SessionLocal()
+	try:
+		deleted = leaderboard.trim(db)
+		logger.info(f"Trimmed {deleted} leaderboard rows")
+	finally:
+		db.close()
+
+
+def rebuild_all() -> None:
+	"""Пересчитываем с нуля все окна за LEADERBOARD_RETENTION_DAYS дней. Нужно после миграции и при расхождении"""
+	db = SessionLocal()
+	try:
+		today = datetime.utcnow().date()
+		for period in LeaderboardPeriod:
+			days = {
+				leaderboard.bucket(period, today - timedelta(days=i))
+				for i in range(settings.LEADERBOARD_RETENTION_DAYS + 1)
+			}
+			for day in sorted(days):
+				leaderboard.rebuild(db, period=period, day=day)
+	finally:
+		db.close()
+
+
+def main() -> None:
+	logging.basicConfig(level=logging.INFO)
+	logger.info("Rebuilding leaderboard")
+	rebuild_all()
+	logger.info("Leaderboard rebuilt")
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,114 @@
+import os
+import glob
+import time
+import threading
+from typing import Dict, List, Tuple
+
+from app.schemas.like import LikesEngagement
+from app.utils.cache import TTLCache
+from app.core.config import settings
+
+# (user_id, entity_type, entity_id) -> True - лайк, False - снятый лайк
+LikeKey = Tuple[int, str, int]
+
+
+class LikesBuffer:
+	"""Write-behind буфер лайков. Намерения like/unlike дописываются строкой в локальный журнал
+	(одна строка - один write в режиме O_APPEND, поэтому несколько процессов сервера пишут в один файл),
+	а поток likes_flusher каждого процесса раз в LIKES_FLUSH_INTERVAL секунд сворачивает их и пишет в бд пачкой.
+	Пока намерение не записано, процесс помнит его в pending, чтобы пользователь сразу видел свой лайк."""
+
+	def __init__(self, path: str, *, pending_ttl: float) -> None:
+		self.path = path
+		self.pending = TTLCache(maxsize=settings.LIKES_PENDING_CACHE_SIZE, ttl=pending_ttl)
+		self._lock = threading.Lock()
+
+	def append(self, *, user_id: int, entity_type: str, entity_id: int, liked: bool) -> None:
+		"""Дописываем намерение в журнал и запоминаем его до записи в бд"""
+		line = f"{user_id}\t{entity_type}\t{entity_id}\t{int(liked)}\n"
+		with self._lock, open(self.path, "a") as log:
+			log.write(line)
+		self.pending.set((user_id, entity_type, entity_id), liked)
+
+	def merge(self, engagement: Dict[int, LikesEngagement], *, entity_type: str, user_id: int) -> None:
+		"""Накладываем еще не записанные намерения user_id на счетчики из бд. engagement уже содержит
+		liked из бд, поэтому count меняется только если намерение с ним расходится"""
+		for entity_id, item in engagement.items():
+			liked = self.pending.get((user_id, entity_type, entity_id))
+			if liked is None or liked == item.liked:
+				continue
+			item.count += 1 if liked else -1
+			item.liked = liked
+
+	def drain(self) -> Tuple[Dict[LikeKey, bool], List[str]]:
+		"""Забираем намерения на запись. Текущий журнал переименовывается и будет прочитан следующим запуском:
+		к этому времени все начатые до переименования записи в него точно завершатся. Журнал разбирают все процессы
+		сервера на машине, поэтому каждый отложенный файл перед чтением захватывается переименованием в имя этого
+		запуска: из параллельных запусков файл достается только одному. Файлы запусков упавших процессов
+		захватываются заново. Возвращает свернутые намерения (последнее по каждой паре пользователь-сущность)
+		и захваченные файлы: после записи их удаляет remove, при ошибке возвращает release"""
+		# намерения сворачиваются по принципу "последнее побеждает", поэтому файлы читаются в порядке
+		# их откладывания, в том числе брошенные упавшими процессами
+		ready = sorted(glob.glob(f"{self.path}.*.flushing") + self._abandoned(), key=self._rotated_at)
+		try:
+			os.replace(self.path, f"{self.path}.{time.time_ns()}.flushing")
+		except FileNotFoundError:
+			# журнал пуст или его только что переименовал другой процесс
+			pass
+		claim = f"{os.getpid()}-{time.time_ns()}"
+		intents, claimed = {}, []
+		for name in ready:
+			target = f"{self._unclaimed(name)}.{claim}"
+			try:
+				os.replace(name, target)
+			except FileNotFoundError:
+				# файл уже захватил другой запуск
+				continue
+			claimed.append(target)
+			with open(target) as log:
+				for line in log:
+					parts = line.split("\t")
+					if len(parts) != 4:
+						# строка, оборванная при падении процесса
+						continue
+					user_id, entity_type, entity_id, liked = parts
+					intents[(int(user_id), entity_type, int(entity_id))] = liked.strip() == "1"
+		return intents, claimed
+
+	def remove(self, files: List[str]) -> None:
+		"""Удаляем захваченные файлы после записи в бд"""
+		for name in files:
+			try:
+				os.remove(name)
+			except FileNotFoundError:
+				pass
+
+	def release(self, files: List[str]) -> None:
+		"""Возвращаем захваченные файлы, если запись не удалась: их прочитает следующий запуск"""
+		for name in files:
+			os.replace(name, self._unclaimed(name))
+
+	def _abandoned(self) -> List[str]:
+		"""Файлы, захваченные процессами, которых уже нет"""
+		abandoned = []
+		for name in sorted(glob.glob(f"{self.path}.*.flushing.*")):
+			pid = int(name.rpartition(".")[2].split("-")[0])
+			try:
+				os.kill(pid, 0)
+			except ProcessLookupError:
+				abandoned.append(name)
+			except PermissionError:
+				pass
+		return abandoned
+
+	def _rotated_at(self, name: str) -> int:
+		"""Время откладывания файла из его имени {path}.{время}.flushing[.{захват}]"""
+		return int(self._unclaimed(name)[len(self.path) + 1:-len(".flushing")])
+
+	@staticmethod
+	def _unclaimed(name: str) -> str:
+		"""Имя файла до захвата: {path}.{время}.flushing"""
+		return name[:name.rindex(".flushing") + len(".flushing")]
+
+
+likes_buffer = LikesBuffer(settings.LIKES_BUFFER_PATH, pending_ttl=settings.LIKES_FLUSH_INTERVAL * 3)
@@ -0,0 +1,70 @@
+import logging
+import threading
+
+from app.db.session import SessionLocal
+from app.crud.crud_like import likes
+from app.utils.likes_buffer import likes_buffer
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def flush_likes() -> int:
+	"""Пишем накопленные в журнале лайки в бд. Если запись не удалась, файлы журнала возвращаются
+	и будут прочитаны следующим запуском. Возвращает число записанных намерений"""
+	intents, files = likes_buffer.drain()
+	try:
+		if intents:
+			db = SessionLocal()
+			try:
+				changed = likes.apply_intents(db, intents=intents)
+				logger.info(f"Flushed {len(intents)} like intents, {changed} rows changed")
+			finally:
+				db.close()
+	except Exception:
+		likes_buffer.release(files)
+		raise
+	likes_buffer.remove(files)
+	return len(intents)
+
+
+class LikesFlusher:
+	"""Фоновый поток процесса сервера, который раз в interval секунд пишет журнал лайков в бд. Журнал лежит
+	на локальном диске процесса, поэтому разбирают его сами процессы сервера, а не воркер celery со своей
+	файловой системой. Процессы одной машины разбирают общий журнал наперегонки (см. LikesBuffer.drain).
+	Запускается при старте приложения в режиме LIKES_WRITE_BEHIND, при остановке дописывает остаток журнала"""
+
+	def __init__(self, *, interval: float) -> None:
+		self.interval = interval
+		self._thread: threading.Thread | None = None
+		self._stop = threading.Event()
+
+	def start(self) -> None:
+		if self._thread is not None:
+			return
+		self._stop.clear()
+		self._thread = threading.Thread(target=self._run, name="likes-flusher", daemon=True)
+		self._thread.start()
+
+	def stop(self) -> None:
+		if self._thread is None:
+			return
+		self._stop.set()
+		self._thread.join()
+		self._thread = None
+		# первый запуск откладывает текущий журнал, второй его записывает
+		for _ in range(2):
+			try:
+				flush_likes()
+			except Exception as e:
+				logger.error(e)
+
+	def _run(self) -> None:
+		while not self._stop.wait(self.interval):
+			try:
+				flush_likes()
+			except Exception as e:
+				logger.error(e)
+
+
+likes_flusher = LikesFlusher(interval=settings.LIKES_FLUSH_INTERVAL)
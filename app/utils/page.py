@@ -1,20 +1,33 @@
+import time
+import base64
+import binascii
+import logging
 from math import ceil
-from typing import Dict
+from datetime import datetime
+from typing import Dict, List, Any, Tuple, Callable, Hashable
 
-from fastapi import HTTPException, status
+from fastapi import HTTPException, status, BackgroundTasks
+from sqlalchemy.orm import Session
 
 from app.schemas.exceptions import ErrorResponse
+from app.db.session import SessionLocal
+from app.utils.cache import TTLCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
 
 
 def page_dict(
 		*,
 		page: int,
 		size: int,
-		total_posts: int
+		total_posts: int,
+		check_page: bool = True
 ) -> Dict[str, int]:
-	"""Рассчитываем общее количество страниц, возвращаю словарь с ключами для модели"""
+	"""Рассчитываем общее количество страниц, возвращаю словарь с ключами для модели.
+	check_page=False - не проверяем номер страницы, нужно когда total взят из кэша и может отставать"""
 	pages = ceil(total_posts / size)
-	if page > pages:
+	if check_page and page > pages:
 		error_response = ErrorResponse(
 			loc="page",
 			msg="Page number is greater than possible.",
@@ -28,5 +41,100 @@ def page_dict(
 		"total": total_posts,
 		"page": page,
 		"size": size,
-		"pages": pages
+		"pages": pages,
+		"has_more": page < pages
+	}
+
+
+def encode_cursor(*, created_at: datetime, id_: int) -> str:
+	"""Упаковываем позицию (created_at, id) последней записи страницы в непрозрачную строку"""
+	raw = f"{created_at.isoformat()}|{id_}".encode()
+	return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+	"""Распаковываем курсор обратно в (created_at, id). Если курсор битый, то будет исключение."""
+	try:
+		created_at, id_ = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+		return datetime.fromisoformat(created_at), int(id_)
+	except (ValueError, binascii.Error, UnicodeDecodeError):
+		error_response = ErrorResponse(
+			loc="cursor",
+			msg="Invalid cursor",
+			type="value_error"
+		)
+		raise HTTPException(
+			status_code=status.HTTP_400_BAD_REQUEST,
+			detail=[error_response.model_dump()]
+		)
+
+
+def lookahead_page_dict(
+		*,
+		items: List[Any],
+		size: int,
+		page: int | None = None
+) -> Dict[str, Any]:
+	"""Страница без подсчета total. items - выборка размером size + 1, лишняя запись говорит о том, что есть
+	следующая страница. page=None - keyset пагинация, курсор строится по последней записи текущей страницы.
+	Иначе это выборка со смещением (page - 1) * size, курсор для нее не строится"""
+	has_more = len(items) > size
+	items = items[:size]
+	if page is not None:
+		return {"items": items, "page": page, "size": size, "has_more": has_more}
+	next_cursor = None
+	if has_more:
+		next_cursor = encode_cursor(created_at=items[-1].created_at, id_=items[-1].id)
+	return {
+		"items": items,
+		"size": size,
+		"has_more": has_more,
+		"next_cursor": next_cursor
 	}
+
+
+class PageTotals:
+	"""Кэш total для пагинации в режиме stale-while-revalidate. Пока значение моложе ttl, оно отдается как есть.
+	Более старое значение (но не старше max_age) тоже отдается сразу, а пересчет уходит в фоновую задачу
+	со своей сессией. Если значения нет, оно считается синхронно."""
+
+	def __init__(self, *, maxsize: int, ttl: int, max_age: int) -> None:
+		self.ttl = ttl
+		self._cache = TTLCache(maxsize=maxsize, ttl=max_age)
+
+	def get(
+			self,
+			db: Session,
+			*,
+			key: Hashable,
+			count: Callable[[Session], int],
+			background_tasks: BackgroundTasks
+	) -> int:
+		cached = self._cache.get(key)
+		if cached is None:
+			total = count(db)
+			self._cache.set(key, (total, time.monotonic()))
+			return total
+		total, refreshed_at = cached
+		if time.monotonic() - refreshed_at > self.ttl:
+			# отмечаем запись свежей сразу, чтобы параллельные запросы не ставили пересчет повторно
+			self._cache.set(key, (total, time.monotonic()))
+			background_tasks.add_task(self._refresh, key, count)
+		return total
+
+	def _refresh(self, key: Hashable, count: Callable[[Session], int]) -> None:
+		db = SessionLocal()
+		try:
+			self._cache.set(key, (count(db), time.monotonic()))
+		except Exception as e:
+			logger.error(e)
+			self._cache.pop(key)
+		finally:
+			db.close()
+
+
+page_totals = PageTotals(
+	maxsize=settings.PAGE_TOTAL_CACHE_SIZE,
+	ttl=settings.PAGE_TOTAL_CACHE_TTL,
+	max_age=settings.PAGE_TOTAL_CACHE_MAX_AGE
+)
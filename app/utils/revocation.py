@@ -0,0 +1,140 @@
+import math
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.revoked_token import RevokedToken
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+	"""Битовый массив из size бит и hashes хэш-функций. Ложных "нет" не бывает, ложное "да" - с вероятностью
+	около error_rate, пока элементов не больше capacity. Позиции считаются двойным хэшированием одного sha256"""
+
+	def __init__(self, *, capacity: int, error_rate: float) -> None:
+		self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+		self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+		self.count = 0
+		self._bits = bytearray((self.size + 7) // 8)
+
+	def _positions(self, item: str) -> Iterable[int]:
+		digest = hashlib.sha256(item.encode()).digest()
+		h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:16], "little") | 1
+		return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+	def add(self, item: str) -> None:
+		for position in self._positions(item):
+			self._bits[position >> 3] |= 1 << (position & 7)
+		self.count += 1
+
+	def __contains__(self, item: str) -> bool:
+		return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+	"""Проверка отзыва токена по jti. Источник правды - таблица revoked_token, в памяти процесса лежит
+	Bloom фильтр всех еще не истекших jti. Если фильтр говорит "нет", токен не отозван и бд не нужна,
+	на "возможно" проверяем строку по первичному ключу.
+
+	Фильтр собирается при первой проверке под блокировкой, свои отзывы процесс добавляет сразу
+	(см. CRUDRevokedToken.revoke), чужие дочитываются по revoked_at не реже раза в REVOCATION_SYNC_INTERVAL
+	секунд, с запасом REVOCATION_SYNC_OVERLAP на транзакции, закоммиченные позже своего revoked_at.
+	Раз в REVOCATION_REBUILD_INTERVAL фильтр собирается заново, чтобы из него ушли истекшие токены. Пересборка
+	идет в фоновом потоке со своей сессией, до ее окончания проверки идут по старому фильтру.
+	Емкость - REVOCATION_BLOOM_CAPACITY или вдвое больше текущего числа отзывов, около 1.8 KiB на 1000 jti"""
+
+	def __init__(self) -> None:
+		self._filter: BloomFilter | None = None
+		self._synced_at = 0.0
+		self._rebuilt_at = 0.0
+		self._sync_from = datetime.min
+		self._refreshing = False
+		self._lock = threading.Lock()
+		self._build_lock = threading.Lock()
+
+	def add(self, jti: str) -> None:
+		"""Отзыв, уже записанный в бд этим процессом"""
+		with self._lock:
+			if self._filter is not None:
+				self._filter.add(jti)
+
+	def is_revoked(self, db: Session, *, jti: str) -> bool:
+		self.ensure(db)
+		if jti not in self._filter:
+			return False
+		return db.get(RevokedToken, jti) is not None
+
+	def ensure(self, db: Session) -> None:
+		"""Первая сборка фильтра идет синхронно, один запрос собирает, остальные ждут его. Устаревший фильтр
+		пересобирается в фоне, до этого и в остальное время дочитываем новые отзывы"""
+		if self._filter is None:
+			with self._build_lock:
+				if self._filter is None:
+					self.rebuild(db)
+			return
+		now = time.monotonic()
+		if now - self._rebuilt_at > settings.REVOCATION_REBUILD_INTERVAL:
+			with self._lock:
+				# отмечаем пересборку сразу, чтобы параллельные запросы не запускали ее повторно
+				started, self._refreshing = not self._refreshing, True
+			if started:
+				threading.Thread(target=self._refresh, name="revocation-rebuild", daemon=True).start()
+		if now - self._synced_at > settings.REVOCATION_SYNC_INTERVAL:
+			self.sync(db)
+
+	def rebuild(self, db: Session) -> None:
+		"""Новый фильтр из всех не истекших отзывов"""
+		started_at, sync_from = self._sync_point()
+		stmt = select(RevokedToken.jti).where(RevokedToken.expires_at > datetime.utcnow())
+		jtis = db.execute(stmt).scalars().all()
+		bloom = BloomFilter(
+			capacity=max(settings.REVOCATION_BLOOM_CAPACITY, 2 * len(jtis)),
+			error_rate=settings.REVOCATION_BLOOM_ERROR_RATE
+		)
+		for jti in jtis:
+			bloom.add(jti)
+		with self._lock:
+			self._filter = bloom
+			self._rebuilt_at = started_at
+			self._sync_from = sync_from
+		logger.info(f"Revocation filter rebuilt: {len(jtis)} tokens, {bloom.size // 8} bytes")
+		# отзывы этого процесса, попавшие во время сборки в старый фильтр, дочитываем сразу
+		self.sync(db)
+
+	def sync(self, db: Session) -> None:
+		"""Добавляем в фильтр отзывы других процессов с прошлой синхронизации"""
+		started_at, sync_from = self._sync_point()
+		stmt = select(RevokedToken.jti).where(RevokedToken.revoked_at > self._sync_from)
+		jtis = db.execute(stmt).scalars().all()
+		with self._lock:
+			for jti in jtis:
+				self._filter.add(jti)
+			self._synced_at = started_at
+			self._sync_from = sync_from
+
+	def _refresh(self) -> None:
+		db = SessionLocal()
+		try:
+			self.rebuild(db)
+		except Exception as e:
+			logger.error(e)
+		finally:
+			self._refreshing = False
+			db.close()
+
+	@staticmethod
+	def _sync_point() -> Tuple[float, datetime]:
+		"""Момент начала чтения и граница revoked_at, с которой начнет следующая синхронизация"""
+		return time.monotonic(), datetime.utcnow() - timedelta(seconds=settings.REVOCATION_SYNC_OVERLAP)
+
+
+revocations = RevocationList()
@@ -0,0 +1,18 @@
+from celery.utils.log import get_task_logger
+
+from app.core.celery_app import celery
+from app.db.session import SessionLocal
+from app.crud.crud_revoked_token import revoked_token
+
+logger = get_task_logger(__name__)
+
+
+@celery.task
+def trim_revoked_tokens() -> None:
+	"""Периодически удаляем отзывы токенов, срок которых уже истек"""
+	db = SessionLocal()
+	try:
+		deleted = revoked_token.trim(db)
+		logger.info(f"Trimmed {deleted} revoked tokens")
+	finally:
+		db.close()
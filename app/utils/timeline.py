@@ -0,0 +1,82 @@
+import logging
+
+from celery.utils.log import get_task_logger
+from sqlalchemy import select
+
+from app.core.celery_app import celery
+from app.db.session import SessionLocal
+from app.crud.crud_timeline import timeline
+from app.crud.crud_feed import feed
+from app.models.post import Post
+from app.models.users import Users
+
+logger = get_task_logger(__name__)
+
+
+@celery.task
+def fan_out_post(post_id: int) -> None:
+	"""Раскладываем новый пост по лентам подписчиков"""
+	db = SessionLocal()
+	try:
+		db_post = db.get(Post, post_id)
+		if not db_post:
+			logger.warning(f"Post {post_id} was deleted before fan out")
+			return
+		inserted = feed.push(db, post_obj=db_post)
+		logger.info(f"Post {post_id} was added to {inserted} timelines")
+	finally:
+		db.close()
+
+
+@celery.task
+def backfill_timeline(*, owner_id: int, author_id: int) -> None:
+	"""Докладываем посты автора в ленту нового подписчика. Посты популярных авторов читаются при запросе ленты"""
+	db = SessionLocal()
+	try:
+		if feed.is_celebrity(db, user_id=author_id):
+			return
+		timeline.backfill(db, owner_id=owner_id, author_id=author_id)
+	finally:
+		db.close()
+
+
+@celery.task
+def prune_timeline(*, owner_id: int, author_id: int) -> None:
+	"""Убираем посты автора из ленты отписавшегося пользователя"""
+	db = SessionLocal()
+	try:
+		timeline.prune_author(db, owner_id=owner_id, author_id=author_id)
+	finally:
+		db.close()
+
+
+@celery.task
+def trim_timelines() -> None:
+	"""Периодически обрезаем ленты до TIMELINE_MAX_LENGTH"""
+	db = SessionLocal()
+	try:
+		deleted = timeline.trim(db)
+		logger.info(f"Trimmed {deleted} timeline rows")
+	finally:
+		db.close()
+
+
+def rebuild_all() -> None:
+	"""Пересобираем ленты всех пользователей. Нужно один раз после миграции и при расхождении данных"""
+	db = SessionLocal()
+	try:
+		for user_id in db.execute(select(Users.id)).scalars().all():
+			timeline.rebuild(db, owner_id=user_id)
+	finally:
+		db.close()
+
+
+def main() -> None:
+	logging.basicConfig(level=logging.INFO)
+	logger.info("Rebuilding timelines")
+	rebuild_all()
+	logger.info("Timelines rebuilt")
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from jose import jwt
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.security import create_access_token, create_refresh_token
+from app.schemas.users import UserCreate
+from app.crud.crud_user import user
+from tests.other_tools import get_random_email, get_random_password
+from tests.conftest import client, session
+
+
+def login(client: TestClient, session) -> tuple:
+	email = get_random_email()
+	password = get_random_password()
+	user.create(session, obj_in=UserCreate(email=email, password=password))
+	client.cookies.clear()
+	response = client.post(f"{settings.API_V1_STR}/login", data={"username": email, "password": password})
+	assert response.status_code == 200
+	return response.json()["access_token"], response.cookies["refresh_token"]
+
+
+def refresh(client: TestClient, refresh_token: str):
+	client.cookies.clear()
+	client.cookies.set("refresh_token", refresh_token)
+	response = client.post(f"{settings.API_V1_STR}/refresh")
+	client.cookies.clear()
+	return response
+
+
+def test_refresh_rotation(client: TestClient, session) -> None:
+	_, refresh_token = login(client, session)
+	response = refresh(client, refresh_token)
+	assert response.status_code == 201
+	rotated = response.cookies["refresh_token"]
+	assert rotated != refresh_token
+	# использованный refresh token повторно не принимается, новый - принимается
+	assert refresh(client, refresh_token).status_code == 401
+	assert refresh(client, rotated).status_code == 201
+
+
+def test_refresh_legacy_token(client: TestClient, session) -> None:
+	db_user = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	expire = datetime.utcnow() + timedelta(minutes=5)
+	legacy = jwt.encode(
+		{"exp": expire, "sub": str(db_user.id), "type": "refresh_token"}, settings.JWT_SECRET, settings.JWT_ALGORITHM
+	)
+	assert refresh(client, legacy).status_code == 201
+	assert refresh(client, legacy).status_code == 401
+
+
+def test_logout(client: TestClient, session) -> None:
+	access_token, refresh_token = login(client, session)
+	headers = {"Authorization": f"Bearer {access_token}"}
+	client.cookies.set("refresh_token", refresh_token)
+	response = client.post(f"{settings.API_V1_STR}/logout", headers=headers)
+	client.cookies.clear()
+	assert response.status_code == 200
+	response = client.get(f"{settings.API_V1_STR}/user/relationships", params={"user_ids": [1]}, headers=headers)
+	assert response.status_code == 401
+	assert refresh(client, refresh_token).status_code == 401
+
+
+def test_deleted_user(client: TestClient, session) -> None:
+	db_user = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	user_id = db_user.id
+	access_token, refresh_token = create_access_token(user_id), create_refresh_token(user_id)
+	user.remove(session, id_=user_id)
+	assert refresh(client, refresh_token).status_code == 400
+	client.cookies.set("refresh_token", refresh_token)
+	response = client.post(f"{settings.API_V1_STR}/logout", headers={"Authorization": f"Bearer {access_token}"})
+	client.cookies.clear()
+	assert response.status_code == 200
@@ -1,11 +1,24 @@
+from datetime import datetime, timedelta
+
 import pytest
+from jose import jwt
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
 from app.core.security import (
 	get_password_hash,
 	verify_password,
+	password_needs_update,
 	create_access_token,
+	create_refresh_token,
 	create_password_reset_token,
-	verify_password_reset_token
+	verify_password_reset_token,
+	verify_token,
+	decode_token,
+	verified_tokens
 )
+from app.core.config import settings
+from app.utils.hashing_pool import HashingPool
 
 
 def test_get_password_hash() -> None:
@@ -41,3 +54,54 @@ def test_verify_password_reset_token(data: str, result: str) -> None:
 	res = verify_password_reset_token(token)
 	assert res == result
 
+
+
+def test_password_needs_update() -> None:
+	assert not password_needs_update(get_password_hash("LOL"))
+	outdated = CryptContext(schemes=["bcrypt"], bcrypt__rounds=settings.BCRYPT_ROUNDS - 1).hash("LOL")
+	assert password_needs_update(outdated)
+	assert verify_password(password="LOL", hashed_password=outdated)
+
+
+def test_hashing_pool_limit(caplog) -> None:
+	pool = HashingPool(processes=1, max_pending=1, stats_interval=0)
+	pool._slots.acquire()
+	with pytest.raises(HTTPException) as e:
+		pool.run(len, "LOL")
+	assert e.value.status_code == 503
+	pool._slots.release()
+	assert pool.run(len, "LOL") == 3
+	assert pool.stats()["submitted"] == 1 and pool.stats()["rejected"] == 1
+	assert "Hashing pool stats" in caplog.text
+
+
+def test_verify_token_cache() -> None:
+	token = create_access_token(42)
+	verified_tokens.clear()
+	hits, misses = verified_tokens.hits, verified_tokens.misses
+	assert verify_token(token) == 42
+	assert verify_token(token) == 42
+	assert (verified_tokens.hits - hits, verified_tokens.misses - misses) == (1, 1)
+
+	expired = jwt.encode(
+		{"exp": datetime.utcnow() - timedelta(seconds=1), "sub": "42"}, settings.JWT_SECRET, settings.JWT_ALGORITHM
+	)
+	with pytest.raises(HTTPException):
+		verify_token(expired)
+	assert len(verified_tokens) == 1
+
+
+def test_decode_token_type() -> None:
+	access_token, refresh_token = create_access_token(42), create_refresh_token(42)
+	token_data = decode_token(refresh_token, token_type="refresh_token")
+	assert token_data.id == 42 and len(token_data.jti) == 32
+	assert decode_token(access_token).jti != token_data.jti
+	# refresh token не подходит как токен доступа и наоборот, в том числе из кэша
+	with pytest.raises(HTTPException):
+		verify_token(refresh_token)
+	with pytest.raises(HTTPException):
+		decode_token(access_token, token_type="refresh_token")
+	with pytest.raises(HTTPException):
+		decode_token(create_password_reset_token("test@example.com"))
+	with pytest.raises(HTTPException):
+		decode_token(None)
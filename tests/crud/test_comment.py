@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+
+from tests.other_tools import get_random_email, get_random_password
+from tests.conftest import client, session
+from app.schemas.users import UserCreate
+from app.schemas.post import PostDBCreate
+from app.schemas.comment import (
+	CommentDBCreate, CommentDBOutWithComments, CommentDBOutWithReplies, CommentsNormalizedOut
+)
+from app.crud.crud_user import user
+from app.crud.crud_post import post
+from app.crud.crud_comment import comment
+
+
+def test_thread(session: Session) -> None:
+	db_user = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	db_post = post.create(session, obj_in=PostDBCreate(content="text", user_id=db_user.id))
+
+	def reply(text: str, parent=None):
+		obj_in = CommentDBCreate(text=text, user_id=db_user.id, parent_comment_id=parent.id if parent else None)
+		return comment.create(session, obj_in=obj_in, obj_to_comment=db_post)
+
+	root = reply("root")
+	first = reply("first", root)
+	nested = reply("nested", first)
+	deep = reply("deep", nested)
+	second = reply("second", root)
+	assert (root.path, root.depth) == (f"{root.id}.", 0)
+	assert (deep.path, deep.depth) == (f"{root.id}.{first.id}.{nested.id}.{deep.id}.", 3)
+	root_id, first_id = root.id, first.id
+	session.expunge_all()
+
+	queries = []
+	listener = lambda *args: queries.append(args[2])
+	event.listen(session.get_bind(), "before_cursor_execute", listener)
+	try:
+		thread = CommentDBOutWithComments.model_validate(comment.get_thread(session, id_=first_id))
+	finally:
+		event.remove(session.get_bind(), "before_cursor_execute", listener)
+	# сам комментарий и вся ветка с предками и авторами
+	assert len(queries) == 2
+	assert thread.parent_comment.text == "root"
+	assert [c.text for c in thread.child_comments] == ["nested"]
+	assert [c.text for c in thread.child_comments[0].child_comments] == ["deep"]
+
+	session.expunge_all()
+	thread = CommentDBOutWithComments.model_validate(comment.get_thread(session, id_=root_id, depth=1))
+	assert [c.text for c in thread.child_comments] == ["first", "second"]
+	assert all(c.child_comments == [] for c in thread.child_comments)
+
+
+def test_object_comments_by_cursor(session: Session) -> None:
+	db_user = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	db_post = post.create(session, obj_in=PostDBCreate(content="text", user_id=db_user.id))
+	top = [
+		comment.create(session, obj_in=CommentDBCreate(text=f"{i}", user_id=db_user.id), obj_to_comment=db_post)
+		for i in range(3)
+	]
+	for _ in range(2):
+		obj_in = CommentDBCreate(text="reply", user_id=db_user.id, parent_comment_id=top[0].id)
+		comment.create(session, obj_in=obj_in, obj_to_comment=db_post)
+
+	first = comment.get_object_comments_by_cursor(session, obj_to_comment=db_post, cursor=None, limit=2)
+	assert [c.text for c in first] == ["0", "1", "2"]
+	assert [CommentDBOutWithReplies.model_validate(c).replies_count for c in first] == [2, 0, 0]
+	second = comment.get_object_comments_by_cursor(
+		session, obj_to_comment=db_post, cursor=(first[1].created_at, first[1].id), limit=2
+	)
+	assert [c.text for c in second] == ["2"]
+
+
+def test_thread_flat(session: Session) -> None:
+	authors = [
+		user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+		for _ in range(2)
+	]
+	db_post = post.create(session, obj_in=PostDBCreate(content="text", user_id=authors[0].id))
+	parent = None
+	for i in range(6):
+		obj_in = CommentDBCreate(text=f"{i}", user_id=authors[i % 2].id, parent_comment_id=parent)
+		parent = comment.create(session, obj_in=obj_in, obj_to_comment=db_post).id
+		if i == 0:
+			root_id = parent
+	session.expunge_all()
+
+	queries = []
+	listener = lambda *args: queries.append(args[2])
+	event.listen(session.get_bind(), "before_cursor_execute", listener)
+	try:
+		db_comments, db_authors = comment.get_thread_flat(session, id_=root_id)
+		thread = CommentsNormalizedOut(comments=db_comments, users={a.id: a for a in db_authors})
+	finally:
+		event.remove(session.get_bind(), "before_cursor_execute", listener)
+	# корень, ветка и авторы без повторов
+	assert len(queries) == 3
+	assert [c.text for c in thread.comments] == [f"{i}" for i in range(6)]
+	assert [c.depth for c in thread.comments] == list(range(6))
+	assert set(thread.users) == {a.id for a in db_authors} and len(thread.users) == 2
+
+
+def test_parent_from_another_object(session: Session) -> None:
+	db_user = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	posts = [post.create(session, obj_in=PostDBCreate(content="text", user_id=db_user.id)) for _ in range(2)]
+	parent = comment.create(session, obj_in=CommentDBCreate(text="root", user_id=db_user.id), obj_to_comment=posts[0])
+	obj_in = CommentDBCreate(text="reply", user_id=db_user.id, parent_comment_id=parent.id)
+	with pytest.raises(HTTPException) as exc_info:
+		comment.create(session, obj_in=obj_in, obj_to_comment=posts[1])
+	assert exc_info.value.status_code == 400
+	assert comment.create(session, obj_in=obj_in, obj_to_comment=posts[0]).depth == 1
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from sqlalchemy.orm import Session
+
+from tests.other_tools import get_random_email, get_random_password
+from tests.conftest import client, session
+from app.schemas.users import UserCreate
+from app.schemas.post import PostDBCreate
+from app.schemas.like import LikeCreate
+from app.schemas.comment import CommentDBCreate
+from app.crud.crud_user import user
+from app.crud.crud_post import post
+from app.crud.crud_feed import feed, ranked_cache
+from app.crud.crud_like import likes
+from app.crud.crud_comment import comment
+from app.crud.crud_timeline import timeline
+from app.core.config import settings
+
+
+def test_hybrid_feed(session: Session, monkeypatch) -> None:
+	monkeypatch.setattr(settings, "CELEBRITY_FOLLOWERS_THRESHOLD", 2)
+	reader, fan, celebrity, author = [
+		user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+		for _ in range(4)
+	]
+	user.follow(session, user_db=reader, user_to_follow=celebrity)
+	user.follow(session, user_db=fan, user_to_follow=celebrity)
+	user.follow(session, user_db=reader, user_to_follow=author)
+	assert feed.is_celebrity(session, user_id=celebrity.id)
+	assert not feed.is_celebrity(session, user_id=author.id)
+
+	posts = []
+	for i in range(6):
+		db_post = post.create(
+			session, obj_in=PostDBCreate(content=f"{i}", user_id=(celebrity if i % 2 else author).id)
+		)
+		feed.push(session, post_obj=db_post)
+		posts.append(db_post)
+	assert timeline.count(session, reader.id) == 3
+	assert feed.count(session, reader.id) == 6
+
+	# пост, попавший в timeline до того как автор стал популярным, в ленте и в ее размере один раз
+	timeline.fan_out(session, post_obj=posts[1], include_followers=True)
+	assert timeline.count(session, reader.id) == 4
+	assert feed.count(session, reader.id) == 6
+
+	expected = [p.id for p in reversed(posts)]
+	assert [p.id for p in feed.get_page(session, page=1, limit=4, owner_id=reader.id)] == expected[:4]
+	assert [p.id for p in feed.get_page(session, page=2, limit=4, owner_id=reader.id)] == expected[4:]
+	assert [p.id for p in feed.get_page(session, page=1, limit=4, owner_id=reader.id, lookahead=True)] == expected[:5]
+	assert feed.get_page(session, page=3, limit=4, owner_id=reader.id) == []
+
+	first = feed.get_by_cursor(session, cursor=None, limit=4, owner_id=reader.id)
+	assert [p.id for p in first] == expected[:5]
+	second = feed.get_by_cursor(session, cursor=(first[3].created_at, first[3].id), limit=4, owner_id=reader.id)
+	assert [p.id for p in second] == expected[4:]
+
+
+def test_ranked_feed(session: Session) -> None:
+	reader, author = [
+		user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+		for _ in range(2)
+	]
+	user.follow(session, user_db=reader, user_to_follow=author)
+	posts = []
+	for i in range(3):
+		db_post = post.create(session, obj_in=PostDBCreate(content=f"{i}", user_id=author.id))
+		feed.push(session, post_obj=db_post)
+		posts.append(db_post)
+	oldest, middle, newest = posts
+	likes.create(session, obj_in=LikeCreate(user_id=reader.id), obj_to_like=oldest)
+	likes.create(session, obj_in=LikeCreate(user_id=author.id), obj_to_like=oldest)
+	comment.create(session, obj_in=CommentDBCreate(text="text", user_id=reader.id), obj_to_comment=middle)
+
+	ranked_cache.clear()
+	assert feed.ranked_ids(session, owner_id=reader.id) == [middle.id, oldest.id, newest.id]
+	db_posts, total = feed.get_ranked_page(session, page=2, limit=2, owner_id=reader.id)
+	assert [p.id for p in db_posts] == [newest.id]
+	assert total == 3
+
+	# Порядок берется из кэша, пока не истек FEED_RANK_CACHE_TTL
+	likes.create(session, obj_in=LikeCreate(user_id=reader.id), obj_to_like=newest)
+	likes.create(session, obj_in=LikeCreate(user_id=author.id), obj_to_like=newest)
+	comment.create(session, obj_in=CommentDBCreate(text="text", user_id=author.id), obj_to_comment=newest)
+	assert feed.ranked_ids(session, owner_id=reader.id)[0] == middle.id
+	ranked_cache.pop(reader.id)
+	assert feed.ranked_ids(session, owner_id=reader.id)[0] == newest.id
+
+
+def test_ranked_score_decay() -> None:
+	half_life = settings.FEED_RANK_HALF_LIFE
+	scores = feed.score(
+		likes=np.array([0.0, 0.0, 5.0]), comments=np.array([0.0, 0.0, 0.0]), age=np.array([0.0, half_life, 0.0])
+	)
+	assert scores[1] == pytest.approx(scores[0] / 2)
+	assert scores[2] > scores[0]
@@ -0,0 +1,62 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from tests.other_tools import get_random_email, get_random_password
+from tests.conftest import client, session
+from app.schemas.users import UserCreate
+from app.schemas.post import PostDBCreate
+from app.schemas.like import LikeCreate
+from app.schemas.leaderboard import LeaderboardPeriod
+from app.models.likes import Likes
+from app.crud.crud_user import user
+from app.crud.crud_post import post
+from app.crud.crud_like import likes
+from app.crud.crud_leaderboard import leaderboard
+from app.core.config import settings
+
+
+def test_bucket() -> None:
+	assert leaderboard.bucket(LeaderboardPeriod.day, date(2024, 1, 4)) == date(2024, 1, 4)
+	assert leaderboard.bucket(LeaderboardPeriod.week, date(2024, 1, 4)) == date(2024, 1, 1)
+	assert leaderboard.bucket(LeaderboardPeriod.week, date(2024, 1, 1)) == date(2024, 1, 1)
+
+
+def test_leaderboard(session: Session, monkeypatch) -> None:
+	users = [
+		user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+		for _ in range(3)
+	]
+	posts = [post.create(session, obj_in=PostDBCreate(content=f"{i}", user_id=users[0].id)) for i in range(3)]
+	ids = [p.id for p in posts]
+	for db_user in users:
+		likes.create(session, obj_in=LikeCreate(user_id=db_user.id), obj_to_like=posts[1])
+	for db_user in users[:2]:
+		likes.create(session, obj_in=LikeCreate(user_id=db_user.id), obj_to_like=posts[2])
+	likes.create(session, obj_in=LikeCreate(user_id=users[0].id), obj_to_like=posts[0])
+	likes.remove_like(session, obj_to_like=posts[0], user_id=users[0].id)
+
+	def top(period: LeaderboardPeriod, limit: int = 10):
+		return [pair for pair in leaderboard.get_top(session, period=period, entity_type="Post", limit=limit)
+				if pair[0] in ids]
+
+	# лайки попадают в топ при пересчете, а не в своей транзакции
+	assert top(LeaderboardPeriod.day) == []
+	leaderboard.refresh(session)
+	assert top(LeaderboardPeriod.day) == [(ids[1], 3), (ids[2], 2)]
+	assert top(LeaderboardPeriod.week) == [(ids[1], 3), (ids[2], 2)]
+
+	# лайк, поставленный вчера, после пересчета уходит из сегодняшнего окна
+	yesterday = datetime.utcnow() - timedelta(days=1)
+	session.execute(
+		update(Likes).where(Likes.entity_id == ids[1], Likes.user_id == users[2].id).values(created_at=yesterday)
+	)
+	session.commit()
+	leaderboard.rebuild(session, period=LeaderboardPeriod.day, day=datetime.utcnow().date())
+	assert top(LeaderboardPeriod.day) == [(ids[2], 2), (ids[1], 2)]
+
+	monkeypatch.setattr(settings, "LEADERBOARD_KEEP", 1)
+	leaderboard.refresh(session)
+	assert len(leaderboard.get_top(session, period=LeaderboardPeriod.day, entity_type="Post", limit=10)) == 1
+	assert len(leaderboard.get_top(session, period=LeaderboardPeriod.week, entity_type="Post", limit=10)) == 1
@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy import event, select, func
+from sqlalchemy.orm import Session
+
+from fastapi import HTTPException
+
+from tests.other_tools import get_random_email, get_random_password
+from tests.conftest import client, session
+from app.schemas.users import UserCreate
+from app.schemas.post import PostDBCreate
+from app.schemas.like import LikeCreate
+from app.models.like_counter import LikeCounter
+from app.crud.crud_user import user
+from app.crud.crud_post import post
+from app.crud.crud_like import likes
+from app.core.config import settings
+
+
+def test_like_counter(session: Session, monkeypatch) -> None:
+	monkeypatch.setattr(settings, "LIKE_COUNTER_SHARDS", 4)
+	users = [
+		user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+		for _ in range(10)
+	]
+	db_post = post.create(session, obj_in=PostDBCreate(content="text", user_id=users[0].id))
+	assert likes.count_likes(session, obj_to_like=db_post) == 0
+	for db_user in users:
+		likes.create(session, obj_in=LikeCreate(user_id=db_user.id), obj_to_like=db_post)
+	assert likes.count_likes(session, obj_to_like=db_post) == 10
+	shards = session.execute(
+		select(func.count("*")).select_from(LikeCounter).where(LikeCounter.entity_id == db_post.id)
+	).scalar_one()
+	assert 1 <= shards <= 4
+
+	with pytest.raises(HTTPException):
+		likes.create(session, obj_in=LikeCreate(user_id=users[0].id), obj_to_like=db_post)
+	likes.remove_like(session, obj_to_like=db_post, user_id=users[0].id)
+	assert likes.count_likes(session, obj_to_like=db_post) == 9
+	with pytest.raises(HTTPException):
+		likes.remove_like(session, obj_to_like=db_post, user_id=users[0].id)
+	assert likes.count_likes(session, obj_to_like=db_post) == 9
+
+
+def test_like_statements(session: Session) -> None:
+	db_user = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	db_post = post.create(session, obj_in=PostDBCreate(content="text", user_id=db_user.id))
+	user_id, post_id = db_user.id, db_post.id
+	queries = []
+
+	def listener(conn, cursor, statement, *args) -> None:
+		# счетчик лайков обновляется отдельным upsert в той же транзакции
+		if "like_counter" not in statement:
+			queries.append(statement)
+
+	event.listen(session.get_bind(), "before_cursor_execute", listener)
+	try:
+		db_like = likes.create(session, obj_in=LikeCreate(user_id=user_id), obj_to_like=db_post)
+		assert len(queries) == 1
+		assert (db_like.entity_type, db_like.entity_id, db_like.user_id) == ("Post", post_id, user_id)
+		session.refresh(db_post)
+		queries.clear()
+		likes.remove_like(session, obj_to_like=db_post, user_id=user_id)
+		assert len(queries) == 1
+	finally:
+		event.remove(session.get_bind(), "before_cursor_execute", listener)
+
+
+def test_get_engagement(session: Session) -> None:
+	reader, author = [
+		user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+		for _ in range(2)
+	]
+	posts = [post.create(session, obj_in=PostDBCreate(content=f"{i}", user_id=author.id)) for i in range(3)]
+	likes.create(session, obj_in=LikeCreate(user_id=reader.id), obj_to_like=posts[0])
+	likes.create(session, obj_in=LikeCreate(user_id=author.id), obj_to_like=posts[0])
+	likes.create(session, obj_in=LikeCreate(user_id=author.id), obj_to_like=posts[1])
+	ids = [p.id for p in posts]
+
+	engagement = likes.get_engagement(session, entity_type="Post", entity_ids=ids, user_id=reader.id)
+	assert [(engagement[id_].count, engagement[id_].liked) for id_ in ids] == [(2, True), (1, False), (0, False)]
+
+	hydrated = post.hydrate(session, posts, liked_by=author.id)
+	assert [(p.engagement.count, p.engagement.liked) for p in hydrated] == [(2, True), (1, True), (0, False)]
+
+
+def test_apply_intents(session: Session) -> None:
+	reader, author = [
+		user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+		for _ in range(2)
+	]
+	posts = [post.create(session, obj_in=PostDBCreate(content=f"{i}", user_id=author.id)) for i in range(2)]
+	likes.create(session, obj_in=LikeCreate(user_id=author.id), obj_to_like=posts[1])
+	ids = [p.id for p in posts]
+	intents = {
+		(reader.id, "Post", ids[0]): True,
+		(author.id, "Post", ids[0]): True,
+		(author.id, "Post", ids[1]): False,
+		(reader.id, "Post", ids[1]): False
+	}
+	assert likes.apply_intents(session, intents=intents) == 3
+	assert likes.apply_intents(session, intents=intents) == 0
+	engagement = likes.get_engagement(session, entity_type="Post", entity_ids=ids, user_id=reader.id)
+	assert [(engagement[id_].count, engagement[id_].liked) for id_ in ids] == [(2, True), (0, False)]
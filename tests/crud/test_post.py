@@ -1,13 +1,22 @@
 import pytest
+import uuid
+from datetime import datetime
 
+from sqlalchemy import event, select
 from sqlalchemy.orm import Session
 
 from fastapi import HTTPException
 
 from tests.conftest import client, session
+from tests.other_tools import get_random_email, get_random_password
 from .conftest import create_user, create_post
 from app.models.post import Post
+from app.models.image import Image
+from app.schemas.post import PostDBOut
+from app.schemas.post import PostDBCreate
+from app.schemas.users import UserCreate
 from app.crud.crud_post import post
+from app.crud.crud_user import user
 
 
 def test_get(session: Session, create_post: Post) -> None:
@@ -24,4 +33,68 @@ def test_get_exception(session: Session, create_post: Post) -> None:
 		db_post = post.get(session, id_=100)
 
 
+def test_hydrate_query_count(session: Session) -> None:
+	author = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	original = post.create(session, obj_in=PostDBCreate(content="original", user_id=author.id))
+	reposts = []
+	for i in range(10):
+		reposter = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+		db_post = post.create(
+			session, obj_in=PostDBCreate(content=f"repost {i}", user_id=reposter.id, original_post_id=original.id)
+		)
+		session.add(
+			Image(name=uuid.uuid4().hex, upload_time=datetime.utcnow(), user_id=reposter.id, post_id=db_post.id)
+		)
+		reposts.append(db_post.id)
+	session.commit()
+	original_id = original.id
 
+	def count_queries(ids) -> int:
+		session.expunge_all()
+		db_posts = session.execute(select(Post).where(Post.id.in_(ids))).scalars().all()
+		queries = []
+		listener = lambda *args: queries.append(args[2])
+		event.listen(session.get_bind(), "before_cursor_execute", listener)
+		try:
+			out = [PostDBOut.model_validate(p) for p in post.hydrate(session, db_posts)]
+		finally:
+			event.remove(session.get_bind(), "before_cursor_execute", listener)
+		assert all(p.original_post.id == original_id and len(p.images) == 1 for p in out)
+		return len(queries)
+
+	# цепочки репостов одним CTE + авторы + картинки, независимо от размера страницы
+	assert count_queries(reposts[:3]) == count_queries(reposts) == 3
+
+
+def test_hydrate_repost_chain(session: Session) -> None:
+	author = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	chain = [post.create(session, obj_in=PostDBCreate(content="root", user_id=author.id))]
+	for i in range(5):
+		chain.append(post.create(
+			session, obj_in=PostDBCreate(content=f"repost {i}", user_id=author.id, original_post_id=chain[-1].id)
+		))
+	ids = [p.id for p in chain]
+
+	out = PostDBOut.model_validate(post.hydrate(session, [chain[-1]], max_depth=2)[0])
+	assert out.original_post.id == ids[-2]
+	assert out.original_post.original_post.id == ids[-3]
+	assert out.original_post.original_post.original_post is None
+
+	out = PostDBOut.model_validate(post.hydrate(session, [chain[-1]], root_original=True)[0])
+	assert out.original_post.id == ids[0]
+	assert out.original_post.original_post is None
+
+
+def test_stream_by_user(session: Session) -> None:
+	db_user = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	created = [post.create(session, obj_in=PostDBCreate(content=f"{i}", user_id=db_user.id)) for i in range(5)]
+	expected = [p.id for p in reversed(created)]
+	user_id = db_user.id
+	session.expunge_all()
+
+	streamed = []
+	for db_posts in post.stream_by_user(session, user_id=user_id, batch_size=2):
+		assert len(db_posts) <= 2
+		streamed.extend(PostDBOut.model_validate(p).id for p in db_posts)
+	assert streamed == expected
+	assert not [obj for obj in session.identity_map.values() if isinstance(obj, Post)]
@@ -0,0 +1,70 @@
+import time
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from tests.other_tools import get_random_email, get_random_password
+from tests.conftest import client, session, TestSessionLocal
+from app.core.config import settings
+from app.schemas.users import UserCreate
+from app.core.security import create_refresh_token, decode_token
+from app.crud.crud_user import user
+from app.crud.crud_revoked_token import revoked_token
+from app.models.revoked_token import RevokedToken
+from app.utils import revocation
+from app.utils.revocation import revocations
+
+
+def test_revoke(session: Session) -> None:
+	db_user = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	token_data = decode_token(create_refresh_token(db_user.id), token_type="refresh_token")
+	other = decode_token(create_refresh_token(db_user.id), token_type="refresh_token")
+	assert not revoked_token.is_revoked(session, jti=token_data.jti)
+	# второй отзыв того же токена (повторная ротация) не проходит
+	assert revoked_token.revoke(session, token_data=token_data)
+	assert not revoked_token.revoke(session, token_data=token_data)
+	assert revoked_token.is_revoked(session, jti=token_data.jti)
+	assert not revoked_token.is_revoked(session, jti=other.jti)
+	# отзыв из другого процесса виден после синхронизации, а после пересборки остается в фильтре
+	session.add(RevokedToken(jti=other.jti, user_id=db_user.id, expires_at=datetime.utcnow() + timedelta(hours=1)))
+	session.commit()
+	revocations.sync(session)
+	assert revoked_token.is_revoked(session, jti=other.jti)
+	revocations.rebuild(session)
+	assert revoked_token.is_revoked(session, jti=token_data.jti)
+
+
+def test_trim(session: Session) -> None:
+	db_user = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	expired = RevokedToken(jti="0" * 32, user_id=db_user.id, expires_at=datetime.utcnow() - timedelta(seconds=1))
+	session.add(expired)
+	session.commit()
+	assert revoked_token.trim(session) >= 1
+	assert session.get(RevokedToken, "0" * 32) is None
+	revocations.rebuild(session)
+	assert not revoked_token.is_revoked(session, jti="0" * 32)
+
+
+def test_background_rebuild(session: Session, monkeypatch) -> None:
+	revocations.ensure(session)
+	stale = revocations._filter
+	release, sessions = threading.Event(), []
+
+	def session_local():
+		release.wait(5)
+		sessions.append(TestSessionLocal())
+		return sessions[-1]
+
+	monkeypatch.setattr(revocation, "SessionLocal", session_local)
+	monkeypatch.setattr(revocations, "_rebuilt_at", time.monotonic() - settings.REVOCATION_REBUILD_INTERVAL - 1)
+	# пока фильтр пересобирается, проверки идут по старому, повторно пересборка не запускается
+	revocations.ensure(session)
+	revocations.ensure(session)
+	assert revocations._filter is stale
+	release.set()
+	for thread in threading.enumerate():
+		if thread.name == "revocation-rebuild":
+			thread.join(5)
+	assert len(sessions) == 1
+	assert revocations._filter is not stale and not revocations._refreshing
@@ -0,0 +1,54 @@
+from sqlalchemy.orm import Session
+
+from tests.other_tools import get_random_email, get_random_password
+from tests.conftest import client, session
+from app.schemas.users import UserCreate
+from app.schemas.post import PostDBCreate
+from app.crud.crud_user import user
+from app.crud.crud_post import post
+from app.crud.crud_timeline import timeline
+from app.core.config import settings
+
+
+def test_fan_out(session: Session) -> None:
+	author = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	reader = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	user.follow(session, user_db=reader, user_to_follow=author)
+	db_post = post.create(session, obj_in=PostDBCreate(content="test", user_id=author.id))
+	assert timeline.fan_out(session, post_obj=db_post) == 2
+	assert timeline.fan_out(session, post_obj=db_post) == 0
+	assert [p.id for p in timeline.get_page(session, page=1, limit=10, owner_id=reader.id)] == [db_post.id]
+	assert [p.id for p in timeline.get_page(session, page=1, limit=10, owner_id=author.id)] == [db_post.id]
+
+	post.remove(session, id_=db_post.id)
+	assert timeline.count(session, reader.id) == 0
+
+
+def test_backfill_and_prune(session: Session) -> None:
+	author = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	reader = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	posts = [post.create(session, obj_in=PostDBCreate(content=f"{i}", user_id=author.id)) for i in range(3)]
+	user.follow(session, user_db=reader, user_to_follow=author)
+	assert timeline.backfill(session, owner_id=reader.id, author_id=author.id) == 3
+	feed = timeline.get_by_cursor(session, cursor=None, limit=10, owner_id=reader.id)
+	assert [p.id for p in feed] == [p.id for p in reversed(posts)]
+
+	user.unfollow(session, user_db=reader, user_to_follow=author)
+	assert timeline.prune_author(session, owner_id=reader.id, author_id=author.id) == 3
+	assert timeline.count(session, reader.id) == 0
+	# backfill, выполнившийся после отписки, ленту не трогает
+	assert timeline.backfill(session, owner_id=reader.id, author_id=author.id) == 0
+	assert timeline.count(session, reader.id) == 0
+
+
+def test_trim(session: Session, monkeypatch) -> None:
+	author = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	posts = [post.create(session, obj_in=PostDBCreate(content=f"{i}", user_id=author.id)) for i in range(4)]
+	timeline.rebuild(session, owner_id=author.id)
+	assert timeline.count(session, author.id) == 4
+
+	monkeypatch.setattr(settings, "TIMELINE_MAX_LENGTH", 2)
+	timeline.trim(session)
+	assert [p.id for p in timeline.get_page(session, page=1, limit=10, owner_id=author.id)] == [
+		posts[3].id, posts[2].id
+	]
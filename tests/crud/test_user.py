@@ -1,13 +1,18 @@
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 import pytest
+from passlib.context import CryptContext
 from datetime import date
 
 from tests.other_tools import get_random_email, get_random_password
 from tests.conftest import client, session
 from .conftest import create_user
 from app.schemas.users import UserCreate, UserUpdate
-from app.crud.crud_user import user
-from app.core.security import verify_password
+from app.schemas.post import PostDBCreate
+from app.crud.crud_user import user, principals
+from app.crud.crud_post import post
+from app.core.security import verify_password, password_needs_update
+from app.core.config import settings
 from app.models.users import Users
 
 
@@ -151,3 +156,132 @@ def test_unfollow(session: Session) -> None:
 	assert not user.is_following(user_db=user_2, user_to_follow=user_1)
 	assert user_1 not in user_2.followed.all()
 
+
+
+def test_counters(session: Session) -> None:
+	user_1 = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	user_2 = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	assert (user_1.posts_count, user_1.followers_count, user_1.following_count) == (0, 0, 0)
+	user.follow(session, user_db=user_1, user_to_follow=user_2)
+	user.follow(session, user_db=user_1, user_to_follow=user_2)
+	assert (user_1.following_count, user_2.followers_count) == (1, 1)
+	db_post = post.create(session, obj_in=PostDBCreate(content="text", user_id=user_2.id))
+	post.create(session, obj_in=PostDBCreate(content="text", user_id=user_2.id))
+	post.remove(session, id_=db_post.id)
+	assert user_2.posts_count == 1
+	user.unfollow(session, user_db=user_1, user_to_follow=user_2)
+	assert (user_1.following_count, user_2.followers_count) == (0, 0)
+
+	user.change_counters(session, user_id=user_2.id, posts_count=5, followers_count=3)
+	session.commit()
+	assert user.reconcile_counters(session) == 1
+	assert (user_2.posts_count, user_2.followers_count, user_2.following_count) == (1, 0, 0)
+
+
+def test_follow_many(session: Session) -> None:
+	user_1 = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	others = [
+		user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+		for _ in range(3)
+	]
+	ids = [u.id for u in others]
+	assert sorted(user.follow_many(session, user_db=user_1, user_ids=ids[:2] + [user_1.id, -1])) == ids[:2]
+	# повторная подписка не добавляет строк и не двигает счетчики
+	assert user.follow_many(session, user_db=user_1, user_ids=ids) == [ids[2]]
+	assert user_1.following_count == 3
+	assert all(user.is_following(user_db=user_1, user_to_follow=u) for u in others)
+	assert user.unfollow_many(session, user_db=user_1, user_ids=[ids[0], ids[0]]) == [ids[0]]
+	assert user.unfollow_many(session, user_db=user_1, user_ids=[ids[0]]) == []
+	assert (user_1.following_count, others[0].followers_count, others[1].followers_count) == (2, 0, 1)
+
+
+def test_follow_lists_by_cursor(session: Session) -> None:
+	star = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	fans = [
+		user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+		for _ in range(3)
+	]
+	for fan in fans:
+		user.follow(session, user_db=fan, user_to_follow=star)
+
+	first = user.get_followers_by_cursor(session, user_id=star.id, cursor=None, limit=2)
+	assert [row.id for row in first] == [fans[2].id, fans[1].id, fans[0].id]
+	second = user.get_followers_by_cursor(
+		session, user_id=star.id, cursor=(first[1].created_at, first[1].id), limit=2
+	)
+	assert [row.id for row in second] == [fans[0].id]
+	assert [row.id for row in user.get_following_by_cursor(session, user_id=fans[0].id, cursor=None, limit=2)] == \
+		[star.id]
+
+
+def test_relationships(session: Session) -> None:
+	users = [
+		user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+		for _ in range(4)
+	]
+	me, mutual, fan, idol = users
+	user.follow(session, user_db=me, user_to_follow=mutual)
+	user.follow(session, user_db=mutual, user_to_follow=me)
+	user.follow(session, user_db=fan, user_to_follow=me)
+	user.follow(session, user_db=me, user_to_follow=idol)
+	user.follow(session, user_db=fan, user_to_follow=idol)
+	relationships = user.get_relationships(session, user_id=me.id, user_ids=[mutual.id, fan.id, idol.id, -1])
+	assert relationships == {
+		mutual.id: (True, True), fan.id: (False, True), idol.id: (True, False), -1: (False, False)
+	}
+	assert user.get_relationships(session, user_id=me.id, user_ids=[]) == {}
+
+
+def test_get_principal(session: Session) -> None:
+	user_1 = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	user_2 = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	user_id, user_2_id = user_1.id, user_2.id
+	principals.pop(user_id)
+	assert user.get_principal(session, id_=user_id).id == user_id
+	session.expunge_all()
+
+	queries = []
+	listener = lambda *args: queries.append(args[2])
+	event.listen(session.get_bind(), "before_cursor_execute", listener)
+	try:
+		principal = user.get_principal(session, id_=user_id)
+		assert principal.email and principal.followers_count == 0
+	finally:
+		event.remove(session.get_bind(), "before_cursor_execute", listener)
+	assert queries == []
+	assert principal in session
+
+	user.update(session, db_obj=principal, obj_in={"name": "changed"})
+	assert principals.get(user_id) is None
+	session.expunge_all()
+	assert user.get_principal(session, id_=user_id).name == "changed"
+	user.follow(session, user_db=user.get(session, id_=user_2_id), user_to_follow=user.get(session, id_=user_id))
+	session.expunge_all()
+	assert user.get_principal(session, id_=user_id).followers_count == 1
+
+
+def test_principal_dropped_after_commit(session: Session) -> None:
+	db_user = user.create(session, obj_in=UserCreate(email=get_random_email(), password=get_random_password()))
+	user_id = db_user.id
+	user.get_principal(session, id_=user_id)
+	# до коммита кэш не трогаем, при откате изменений кэш остается верным
+	user.change_counters(session, user_id=user_id, posts_count=1)
+	assert principals.get(user_id) is not None
+	session.rollback()
+	assert principals.get(user_id) is not None
+	user.change_counters(session, user_id=user_id, posts_count=1)
+	session.commit()
+	assert principals.get(user_id) is None
+	session.expunge_all()
+	assert user.get_principal(session, id_=user_id).posts_count == 1
+
+
+def test_authenticate_rehash(session: Session) -> None:
+	email, password = get_random_email(), get_random_password()
+	db_user = user.create(session, obj_in=UserCreate(email=email, password=password))
+	db_user.hashed_password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=settings.BCRYPT_ROUNDS - 1).hash(password)
+	session.commit()
+	outdated = db_user.hashed_password
+	assert user.authenticate(session, email=email, password=password)
+	assert db_user.hashed_password != outdated and not password_needs_update(db_user.hashed_password)
+	assert verify_password(password=password, hashed_password=db_user.hashed_password)
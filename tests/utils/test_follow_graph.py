@@ -0,0 +1,70 @@
+import threading
+
+import numpy as np
+
+from app.utils import follow_graph
+from app.utils.follow_graph import FollowGraph
+
+
+def make_graph(edges) -> FollowGraph:
+	graph = FollowGraph(refresh_interval=60)
+	graph._indptr, graph._indices = FollowGraph.build([np.array(edges, dtype=np.int64)])
+	graph._active = True
+	return graph
+
+
+def test_build() -> None:
+	indptr, indices = FollowGraph.build([np.array([(3, 1), (1, 2)]), np.array([(1, 3)])])
+	assert indptr.tolist() == [0, 0, 2, 2, 3]
+	assert indices.tolist() == [2, 3, 1]
+	indptr, indices = FollowGraph.build([])
+	assert (indptr.tolist(), indices.tolist()) == ([0], [])
+
+
+def test_suggestions() -> None:
+	# 1 подписан на 2 и 3, оба подписаны на 4, 3 еще и на 5 и на самого 1
+	graph = make_graph([(1, 2), (1, 3), (2, 4), (3, 4), (3, 5), (3, 1)])
+	assert graph.suggestions(1, limit=10) == [(4, 2), (5, 1)]
+	assert graph.suggestions(1, limit=1) == [(4, 2)]
+	assert graph.suggestions(4, limit=10) == []
+	assert graph.suggestions(100, limit=10) == []
+
+
+def test_overlay() -> None:
+	graph = make_graph([(1, 2), (2, 4), (3, 5)])
+	graph.record(user_id=1, user_ids=[3], followed=True)
+	graph.record(user_id=2, user_ids=[4], followed=False)
+	graph.record(user_id=3, user_ids=[7], followed=True)
+	assert graph.following(1).tolist() == [2, 3]
+	assert graph.suggestions(1, limit=10) == [(5, 1), (7, 1)]
+	# новый пользователь, которого нет в снимке
+	graph.record(user_id=10, user_ids=[1], followed=True)
+	assert graph.suggestions(10, limit=10) == [(2, 1), (3, 1)]
+
+
+class FakeSession:
+	def close(self) -> None:
+		pass
+
+
+def test_background_build(monkeypatch) -> None:
+	graph = FollowGraph(refresh_interval=60)
+	release = threading.Event()
+
+	def read_edges(db):
+		release.wait(5)
+		return [np.array([(1, 2), (2, 3)], dtype=np.int64)]
+
+	monkeypatch.setattr(follow_graph, "SessionLocal", FakeSession)
+	monkeypatch.setattr(graph, "_read_edges", read_edges)
+	graph.start()
+	# пока снимок собирается, запросы его не ждут и повторно сборку не запускают
+	graph.ensure(background_tasks=None)
+	graph.record(user_id=1, user_ids=[4], followed=True)
+	assert graph.suggestions(1, limit=10) == []
+	release.set()
+	for thread in threading.enumerate():
+		if thread.name == "follow-graph-build":
+			thread.join(5)
+	assert graph.following(1).tolist() == [2, 4]
+	assert graph.suggestions(1, limit=10) == [(3, 1)]
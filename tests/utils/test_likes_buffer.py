@@ -0,0 +1,56 @@
+import os
+
+from app.schemas.like import LikesEngagement
+from app.utils.likes_buffer import LikesBuffer
+
+
+def test_drain(tmp_path) -> None:
+	buffer = LikesBuffer(str(tmp_path / "likes.log"), pending_ttl=60)
+	buffer.append(user_id=1, entity_type="Post", entity_id=10, liked=True)
+	buffer.append(user_id=2, entity_type="Post", entity_id=10, liked=True)
+	buffer.append(user_id=1, entity_type="Post", entity_id=10, liked=False)
+	# первый запуск только откладывает журнал, чтобы дописались начатые записи
+	assert buffer.drain() == ({}, [])
+	buffer.append(user_id=3, entity_type="Post", entity_id=11, liked=True)
+	intents, files = buffer.drain()
+	assert intents == {(1, "Post", 10): False, (2, "Post", 10): True}
+	assert len(files) == 1
+	# захваченный файл не достается параллельному запуску
+	assert buffer.drain()[0] == {(3, "Post", 11): True}
+	# запись не удалась, файл возвращается и будет прочитан снова
+	buffer.release(files)
+	intents, files = buffer.drain()
+	assert (1, "Post", 10) in intents and len(files) == 1
+	buffer.remove(files)
+	buffer.remove(files)
+	assert buffer.drain() == ({}, [])
+
+
+def test_drain_abandoned(tmp_path) -> None:
+	buffer = LikesBuffer(str(tmp_path / "likes.log"), pending_ttl=60)
+	buffer.append(user_id=1, entity_type="Post", entity_id=10, liked=True)
+	buffer.drain()
+	intents, files = buffer.drain()
+	assert len(files) == 1
+	# более позднее намерение уже отложено в новый файл
+	buffer.append(user_id=1, entity_type="Post", entity_id=10, liked=False)
+	assert buffer.drain() == ({}, [])
+	# файл, захваченный процессом, которого уже нет, захватывается заново и читается раньше более нового
+	os.replace(files[0], f"{LikesBuffer._unclaimed(files[0])}.{2 ** 22 + 1}-1")
+	intents, files = buffer.drain()
+	assert intents == {(1, "Post", 10): False} and len(files) == 2
+
+
+def test_merge(tmp_path) -> None:
+	buffer = LikesBuffer(str(tmp_path / "likes.log"), pending_ttl=60)
+	buffer.append(user_id=1, entity_type="Post", entity_id=10, liked=True)
+	buffer.append(user_id=1, entity_type="Post", entity_id=11, liked=True)
+	buffer.append(user_id=1, entity_type="Post", entity_id=12, liked=False)
+	engagement = {
+		10: LikesEngagement(entity_id=10, count=3, liked=False),
+		11: LikesEngagement(entity_id=11, count=3, liked=True),
+		12: LikesEngagement(entity_id=12, count=3, liked=True),
+		13: LikesEngagement(entity_id=13, count=3, liked=False)
+	}
+	buffer.merge(engagement, entity_type="Post", user_id=1)
+	assert [(e.count, e.liked) for e in engagement.values()] == [(4, True), (3, True), (2, False), (3, False)]
@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+from datetime import datetime
+
+from fastapi import BackgroundTasks
+
+from app.utils.page import lookahead_page_dict, decode_cursor, PageTotals
+
+
+def test_lookahead_page_dict() -> None:
+	items = [SimpleNamespace(id=i, created_at=datetime(2024, 1, 1, 12, i)) for i in range(3)]
+	page = lookahead_page_dict(items=items, size=2)
+	assert page["items"] == items[:2]
+	assert page["has_more"]
+	assert decode_cursor(page["next_cursor"]) == (items[1].created_at, items[1].id)
+
+	page = lookahead_page_dict(items=items, size=3)
+	assert not page["has_more"]
+	assert page["next_cursor"] is None
+
+	# страница со смещением отдается без курсора
+	page = lookahead_page_dict(items=items, size=2, page=3)
+	assert page == {"items": items[:2], "page": 3, "size": 2, "has_more": True}
+
+
+def test_page_totals_stale_while_revalidate() -> None:
+	totals = PageTotals(maxsize=10, ttl=0, max_age=60)
+	calls = []
+
+	def count(db) -> int:
+		calls.append(db)
+		return len(calls)
+
+	background_tasks = BackgroundTasks()
+	assert totals.get(None, key="feed", count=count, background_tasks=background_tasks) == 1
+	assert not background_tasks.tasks
+	# значение устарело (ttl=0): отдается старое, пересчет уходит в фон
+	assert totals.get(None, key="feed", count=count, background_tasks=background_tasks) == 1
+	assert len(background_tasks.tasks) == 1
+	task = background_tasks.tasks[0]
+	task.func(*task.args, **task.kwargs)
+	assert totals.get(None, key="feed", count=count, background_tasks=BackgroundTasks()) == 2
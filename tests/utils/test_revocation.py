@@ -0,0 +1,21 @@
+from uuid import uuid4
+
+from app.utils.revocation import BloomFilter
+
+
+def test_bloom_filter() -> None:
+	bloom = BloomFilter(capacity=1000, error_rate=0.01)
+	assert bloom.size == 9585 and bloom.hashes == 7
+	added = [uuid4().hex for _ in range(1000)]
+	for jti in added:
+		bloom.add(jti)
+	assert all(jti in bloom for jti in added)
+	false_positives = sum(uuid4().hex in bloom for _ in range(10000))
+	assert false_positives < 300
+
+
+def test_bloom_filter_empty() -> None:
+	bloom = BloomFilter(capacity=10, error_rate=0.001)
+	assert "jti" not in bloom
+	bloom.add("jti")
+	assert "jti" in bloom and bloom.count == 1